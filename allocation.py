@@ -0,0 +1,50 @@
+import numpy as np
+from scipy.optimize import linprog
+from scipy.sparse import csr_matrix
+
+
+def ranking_costs(ranked_laptops, distances, size):
+    # Cost of giving a role each laptop: the k-NN distance to that laptop's nearest training examples,
+    # made non-decreasing down the role's ranking so unlimited stock reproduces recommend_laptop
+    costs = np.full(size, np.inf)
+    costs[ranked_laptops] = np.maximum.accumulate(distances) + np.arange(len(ranked_laptops)) * 1e-6
+    return costs
+
+
+def allocate(demand, costs, supply):
+    # Min-cost transportation from employee groups to laptop models:
+    #     demand (groups,)         employees in each group
+    #     costs  (groups, models)  np.inf where a group cannot take a model
+    #     supply (models,)         free units of each model
+    # Returns an integer (groups, models) allocation. When stock runs short, row sums fall below demand;
+    # leaving an employee out costs more than any chain of reassignments, so as many as possible are placed.
+    demand = np.asarray(demand, dtype=np.int64)
+    costs = np.asarray(costs, dtype=np.float64)
+    supply = np.asarray(supply, dtype=np.int64)
+    groups, models = costs.shape
+    allocation = np.zeros((groups, models), dtype=np.int64)
+    if not groups or not demand.sum():
+        return allocation
+
+    # One variable per feasible (group, model) pair, plus an "unplaced" variable per group
+    rows, columns = np.nonzero(np.isfinite(costs) & (supply > 0)[None, :])
+    finite = costs[rows, columns]
+    unplaced_cost = (finite.max(initial=0) + 1) * (demand.sum() + 1)
+    pairs = len(rows)
+    objective = np.concatenate([finite, np.full(groups, unplaced_cost)])
+
+    # Each group's variables add up to its demand
+    equality = csr_matrix(
+        (np.ones(pairs + groups), (np.concatenate([rows, np.arange(groups)]), np.arange(pairs + groups))),
+        shape=(groups, pairs + groups)
+    )
+    # No model gives out more units than it has free
+    inequality = csr_matrix((np.ones(pairs), (columns, np.arange(pairs))), shape=(models, pairs + groups))
+
+    # The constraint matrix is totally unimodular, so the simplex vertex is already integral
+    result = linprog(objective, A_ub=inequality, b_ub=supply, A_eq=equality, b_eq=demand,
+                     bounds=(0, None), method='highs-ds')
+    if not result.success:
+        raise RuntimeError(f"Allocation failed: {result.message}")
+    allocation[rows, columns] = np.rint(result.x[:pairs]).astype(np.int64)
+    return allocation
@@ -0,0 +1,391 @@
+import asyncio
+import datetime
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from quart import Quart, Response, g, request, jsonify
+
+from cache import laptop_tag
+from db import get_async_client, get_async_database, close_async_client, pool_stats
+from events import LAPTOP_ASSIGNED, LAPTOP_RETURNED
+from maintenance import MAINTENANCE_SKIP_DUE
+from service import LaptopRecommendationModel
+from metrics import HTTP_REQUEST_SECONDS, profiler, registry
+from onboarding import supports_transactions
+from tickets import TICKET_CONFLICT, TICKET_UPDATE_OK
+
+# Same endpoints and payloads as api.py, served from one asyncio event loop:
+#     hypercorn async_api:app --bind 0.0.0.0:5000
+app = Quart(__name__)
+
+# k-NN inference and other CPU-bound model work runs here instead of on the event loop
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='model')
+
+model = None
+onboarding_offboarding = None
+reservation_system = None
+
+
+class AsyncOnboardingOffboarding:
+    def __init__(self, client, db, onboarding_offboarding):
+        # Reuse the sync system's documents, filter and update builders, inventory hook and event log
+        self.client = client
+        self.collection = db['onboarding_offboarding_data']
+        self.laptops = db['available_laptops']
+        self.onboarding_offboarding = onboarding_offboarding
+
+    async def _run(self, work):
+        if supports_transactions(self.client):
+            async with self.client.start_session() as session:
+                return await session.with_transaction(work)
+        return await work(None)
+
+    async def assign_laptop(self, employee_id, name, role, laptop_name):
+        # Same claim-then-record order as OnboardingOffboarding.assign_laptop; returns (message, error)
+        system = self.onboarding_offboarding
+        if not employee_id:
+            return None, 'Employee ID is required.'
+        date = datetime.datetime.now().strftime('%Y-%m-%d')
+
+        async def work(session):
+            unit = await self.laptops.find_one_and_update(*system._unit_claim(employee_id, laptop_name, date),
+                                                          return_document=ReturnDocument.AFTER, session=session)
+            if unit is None:
+                return None
+            try:
+                await self.collection.insert_one(
+                    system._assignment(employee_id, name, role, laptop_name, date, unit['_id']), session=session)
+            except PyMongoError:
+                if session is None:
+                    await self.laptops.update_one({'_id': unit['_id']}, {'$set': {'Assigned': None}})
+                raise
+            return unit
+
+        unit = await self._run(work)
+        if unit is None:
+            return None, f"Laptop '{laptop_name}' is not available."
+        system._write_through([unit], [laptop_name])
+        system._record(LAPTOP_ASSIGNED, employee_id=employee_id, name=name, role=role, laptop_name=laptop_name)
+        return f"Laptop '{laptop_name}' assigned to employee '{employee_id}'.", None
+
+    async def return_laptop(self, employee_id, laptop_name):
+        # Same archive-then-release order as OnboardingOffboarding.return_laptop
+        system = self.onboarding_offboarding
+        return_date = datetime.datetime.now().strftime('%Y-%m-%d')
+
+        async def work(session):
+            record = await self.collection.find_one_and_update(
+                system._active_assignment(employee_id, laptop_name), system._archive_update(return_date),
+                session=session)
+            if record is None:
+                return None
+            try:
+                unit = await self.laptops.find_one_and_update(*system._unit_release(record),
+                                                              return_document=ReturnDocument.AFTER, session=session)
+            except PyMongoError:
+                if session is None:
+                    await self.collection.update_one({'_id': record['_id']}, system._reactivate_update())
+                raise
+            return [unit] if unit is not None else []
+
+        units = await self._run(work)
+        if units is None:
+            return f"No active assignment found for laptop '{laptop_name}' with employee '{employee_id}'."
+        system._write_through(units, [laptop_name])
+        system._record(LAPTOP_RETURNED, employee_id=employee_id, laptop_name=laptop_name)
+        return f"Laptop '{laptop_name}' returned by employee '{employee_id}' and record archived."
+
+
+class AsyncReservationSystem:
+    def __init__(self, db, reservation_system):
+        # Reuse the sync system's query builders, contention counters and inventory hook
+        self.collection = db['available_laptops']
+        self.reservation_system = reservation_system
+
+    async def reserve_laptop(self, laptop_name, manager_name, hold_minutes=None):
+        now = datetime.datetime.now()
+        laptop = await self.collection.find_one_and_update(
+            self.reservation_system._free_filter(laptop_name, now),
+            self.reservation_system._reservation_update(manager_name, now, hold_minutes, str(uuid.uuid4())),
+            return_document=ReturnDocument.AFTER
+        )
+        if laptop:
+            self.reservation_system._count('reservations')
+            self.reservation_system._write_through([laptop])
+            self.reservation_system._record_reservation([laptop])
+            return f"Laptop '{laptop_name}' reserved by '{manager_name}'."
+        else:
+            self.reservation_system._count('rejections')
+            return f"Laptop '{laptop_name}' is not available for reservation or already reserved."
+
+    async def check_reservation(self, laptop_name):
+        # Shares the response cache and its version tags with the sync model
+        cache = self.reservation_system.cache
+        key = json.dumps(['check', laptop_name])
+        tags = [laptop_tag(laptop_name)]
+        if cache is not None and cache.ttl > 0:
+            hit, message = cache.lookup(key, tags)
+            if hit:
+                return message
+            versions = cache.tag_versions(tags)
+        message = await self._check_reservation(laptop_name)
+        if cache is not None and cache.ttl > 0:
+            cache.store(key, message, versions)
+        return message
+
+    async def _check_reservation(self, laptop_name):
+        laptop = await self.collection.find_one({'Laptop Name': laptop_name})
+        if laptop:
+            reserved = laptop.get('Reserved') or {}
+            reserved_by = reserved.get('reserved_by')
+            expires_at = reserved.get('expires_at')
+            if reserved_by and (expires_at is None or expires_at > datetime.datetime.now()):
+                return f"Laptop '{laptop_name}' is reserved by '{reserved_by}'."
+            else:
+                return f"Laptop '{laptop_name}' is not reserved."
+        else:
+            return f"Laptop '{laptop_name}' not found."
+
+
+async def run_in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+@app.before_serving
+async def startup():
+    global model, onboarding_offboarding, reservation_system
+    model = LaptopRecommendationModel()
+    # Building the wrapped systems reads the inventory, which is blocking, so keep it off the event loop;
+    # the k-NN model itself still waits for the first recommendation
+    await run_in_executor(model.load, 'onboarding_offboarding', 'reservation_system')
+    db = get_async_database()
+    onboarding_offboarding = AsyncOnboardingOffboarding(get_async_client(), db, model.onboarding_offboarding)
+    reservation_system = AsyncReservationSystem(db, model.reservation_system)
+
+
+@app.before_request
+async def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+async def record_latency(response):
+    started = getattr(g, 'started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method,
+                                     status=response.status_code)
+    return response
+
+
+@app.after_serving
+async def shutdown():
+    await close_async_client()
+    model.close()
+    executor.shutdown(wait=False)
+
+
+@app.route('/recommend', methods=['POST'])
+async def recommend_laptop():
+    data = await request.get_json()
+    role = data.get('role')
+    require_gpu = data.get('require_gpu', None)
+    top_k = data.get('top_k', 1)
+    if not isinstance(role, str):
+        return jsonify({'error': 'Role must be a string.'}), 400
+    if type(top_k) is not int or top_k < 1:
+        return jsonify({'error': 'top_k must be a positive integer.'}), 400
+    for field in ('min_cpu', 'min_ram', 'min_storage'):
+        if data.get(field) is not None and type(data.get(field)) not in (int, float):
+            return jsonify({'error': f"{field} must be a number."}), 400
+    laptops, status = await run_in_executor(
+        model.recommend_top_laptops,
+        role, require_gpu, top_k,
+        data.get('min_cpu'), data.get('min_ram'), data.get('min_storage'),
+        data.get('skip_maintenance', MAINTENANCE_SKIP_DUE)
+    )
+    if laptops:
+        response = {'laptop': laptops[0], 'status': status}
+        if top_k > 1:
+            response['alternatives'] = laptops[1:]
+        return jsonify(response), 200
+    else:
+        return jsonify({'error': status}), 400
+
+@app.route('/onboard', methods=['POST'])
+async def onboard_employee():
+    data = await request.get_json()
+    employee_id = data.get('employee_id')
+    name = data.get('name')
+    role = data.get('role')
+    require_gpu = data.get('require_gpu', None)
+    if not employee_id:
+        return jsonify({'error': 'Employee ID is required.'}), 400
+    laptop, status = await run_in_executor(model.recommend_laptop, role, require_gpu)
+    if laptop:
+        assignment_message, error = await onboarding_offboarding.assign_laptop(employee_id, name, role, laptop)
+        message = error or f"{assignment_message} Maintenance status: {status}"
+    else:
+        message = status
+    return jsonify({'message': message}), 200
+
+@app.route('/recommend/batch', methods=['POST'])
+async def recommend_laptops():
+    data = await request.get_json()
+    employees = data.get('employees')
+    if not isinstance(employees, list):
+        return jsonify({'error': 'A list of employees is required.'}), 400
+    results = await run_in_executor(model.recommend_employees, employees)
+    return jsonify({'results': results}), 200
+
+@app.route('/onboard/batch', methods=['POST'])
+async def onboard_employees():
+    data = await request.get_json()
+    employees = data.get('employees')
+    if not isinstance(employees, list):
+        return jsonify({'error': 'A list of employees is required.'}), 400
+    results = await run_in_executor(model.onboard_employees, employees)
+    return jsonify({'results': results}), 200
+
+@app.route('/onboard/cohort', methods=['POST'])
+async def allocate_cohort():
+    data = await request.get_json()
+    employees = data.get('employees')
+    if not isinstance(employees, list):
+        return jsonify({'error': 'A list of employees is required.'}), 400
+    results = await run_in_executor(model.allocate_cohort, employees)
+    return jsonify({'results': results}), 200
+
+@app.route('/offboard', methods=['POST'])
+async def offboard_employee():
+    data = await request.get_json()
+    employee_id = data.get('employee_id')
+    laptop_name = data.get('laptop_name')
+    message = await onboarding_offboarding.return_laptop(employee_id, laptop_name)
+    return jsonify({'message': message}), 200
+
+@app.route('/offboard/batch', methods=['POST'])
+async def offboard_employees():
+    data = await request.get_json()
+    employees = data.get('employees')
+    if not isinstance(employees, list):
+        return jsonify({'error': 'A list of employees is required.'}), 400
+    results = await run_in_executor(model.offboard_employees, employees)
+    return jsonify({'results': results}), 200
+
+@app.route('/reserve', methods=['POST'])
+async def reserve_laptop():
+    data = await request.get_json()
+    laptop_name = data.get('laptop_name')
+    manager_name = data.get('manager_name')
+    quantity = data.get('quantity', 1)
+    hold_minutes = data.get('hold_minutes', None)
+    if type(quantity) is not int or quantity < 1:
+        return jsonify({'error': 'Quantity must be a positive integer.'}), 400
+    if hold_minutes is not None and (type(hold_minutes) not in (int, float) or hold_minutes <= 0):
+        return jsonify({'error': 'hold_minutes must be a positive number.'}), 400
+    if quantity > 1:
+        message = await run_in_executor(model.reserve_laptops, laptop_name, manager_name, quantity, hold_minutes)
+    else:
+        message = await reservation_system.reserve_laptop(laptop_name, manager_name, hold_minutes)
+    return jsonify({'message': message}), 200
+
+@app.route('/check', methods=['POST'])
+async def check_reservation():
+    data = await request.get_json()
+    laptop_name = data.get('laptop_name')
+
+    if not laptop_name:
+        return jsonify({"message": "Laptop name is required."}), 400
+
+    result = await reservation_system.check_reservation(laptop_name)
+    return jsonify({"message": result})
+
+@app.route('/model/update', methods=['POST'])
+async def update_model():
+    rows = await run_in_executor(model.update_from_history)
+    return jsonify({'message': f"Model updated with {rows} new onboarding records."}), 200
+
+@app.route('/tickets', methods=['GET'])
+async def list_tickets():
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', 50, type=int)
+    status = request.args.get('status')
+    tickets = await run_in_executor(model.ticketing_system.get_tickets, page, page_size, status)
+    total = await run_in_executor(model.ticketing_system.count_tickets, status)
+    return jsonify({'tickets': tickets, 'page': page, 'page_size': page_size, 'total': total}), 200
+
+@app.route('/tickets/update', methods=['POST'])
+async def update_ticket():
+    data = await request.get_json()
+    ticket_id = data.get('ticket_id')
+    status = data.get('status')
+    if not ticket_id or not status:
+        return jsonify({'error': 'Ticket ID and status are required.'}), 400
+    result = await run_in_executor(model.ticketing_system.update_ticket, ticket_id, status)
+    if result == TICKET_UPDATE_OK:
+        return jsonify({'message': f"Ticket '{ticket_id}' updated to '{status}'."}), 200
+    elif result == TICKET_CONFLICT:
+        return jsonify({'error': f"Ticket '{ticket_id}' cannot be set to '{status}': "
+                                 f"another open ticket already covers the same issue."}), 409
+    else:
+        return jsonify({'error': f"Ticket '{ticket_id}' not found."}), 404
+
+@app.route('/maintenance', methods=['GET'])
+async def maintenance_report():
+    state = request.args.get('state')
+    laptops = await run_in_executor(model.predictive_maintenance.fleet_report, state)
+    return jsonify({'laptops': laptops}), 200
+
+@app.route('/maintenance/update', methods=['POST'])
+async def update_maintenance_status():
+    data = await request.get_json()
+    laptop_name = data.get('laptop_name')
+    status = data.get('status')
+    message = await run_in_executor(model.predictive_maintenance.update_maintenance_status, laptop_name, status)
+    return jsonify({'message': message}), 200
+
+@app.route('/stats/reservations', methods=['GET'])
+async def reservation_stats():
+    return jsonify(model.reservation_system.get_stats()), 200
+
+@app.route('/stats/cache', methods=['GET'])
+async def cache_stats():
+    return jsonify(model.response_cache.get_stats()), 200
+
+@app.route('/stats/events', methods=['GET'])
+async def event_log_stats():
+    return jsonify(model.event_log.get_stats()), 200
+
+@app.route('/stats/mongo', methods=['GET'])
+async def mongo_pool_stats():
+    return jsonify(pool_stats()), 200
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['GET'])
+async def profile():
+    return Response(profiler.folded(), mimetype='text/plain')
+
+@app.route('/debug/profile', methods=['POST'])
+async def toggle_profiler():
+    action = ((await request.get_json()) or {}).get('action')
+    if action == 'start':
+        profiler.start()
+    elif action == 'stop':
+        profiler.stop()
+    elif action == 'reset':
+        profiler.reset()
+    else:
+        return jsonify({'error': "action must be 'start', 'stop' or 'reset'."}), 400
+    return jsonify({'running': profiler.running}), 200
+
+
+if __name__ == '__main__':
+    app.run()
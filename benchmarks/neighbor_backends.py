@@ -0,0 +1,84 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from neighbors import NEIGHBOR_BACKENDS
+from features import FeatureStore
+from train import TRAINING_CSV, read_training_csv, fit_model
+
+# Compare k-NN backends as the training set grows:
+#     python -m benchmarks.neighbor_backends --scales 1 10 100 1000
+
+
+def synthesize(data, scale, seed=42):
+    # Resample the real rows and jitter the numeric requirements so larger catalogs are not exact copies
+    if scale == 1:
+        return data
+    rng = np.random.default_rng(seed)
+    sample = data.sample(n=len(data) * scale, replace=True, random_state=seed).reset_index(drop=True)
+    sample['Required CPU Speed (GHz)'] = (sample['Required CPU Speed (GHz)'] * rng.normal(1, 0.05, len(sample))).round(2)
+    sample['Required RAM (GB)'] = (sample['Required RAM (GB)'] * rng.choice([0.5, 1, 1, 1, 2], len(sample))).astype(int)
+    sample['Required Storage (GB)'] = (sample['Required Storage (GB)'] * rng.choice([0.5, 1, 1, 1, 2], len(sample))).astype(int)
+    return sample
+
+
+def role_queries(features, poly, scaler):
+    # One query per role: the mean requirements, exactly what the model asks at serve time
+    return scaler.transform(poly.transform(features.role_feature_matrix()[1]))
+
+
+def benchmark(data, backend, queries, repeats):
+    started = time.perf_counter()
+    knn = fit_model(data, backend)[2]
+    fit_seconds = time.perf_counter() - started
+
+    # Single-row queries, as served per request
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            started = time.perf_counter()
+            knn.predict(query[None, :])
+            latencies.append(time.perf_counter() - started)
+    latencies_ms = np.array(latencies) * 1000
+
+    return knn, {
+        'backend': backend,
+        'fit_seconds': round(fit_seconds, 4),
+        'query_p50_ms': round(float(np.percentile(latencies_ms, 50)), 4),
+        'query_p99_ms': round(float(np.percentile(latencies_ms, 99)), 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark k-NN backends on synthetic training sets.')
+    parser.add_argument('--csv', default=TRAINING_CSV, help='training data CSV to scale up')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='training set size multipliers')
+    parser.add_argument('--backends', nargs='+', default=list(NEIGHBOR_BACKENDS), choices=NEIGHBOR_BACKENDS)
+    parser.add_argument('--repeats', type=int, default=5, help='passes over the role queries per backend')
+    parser.add_argument('--output', help='write results as JSON to this file instead of stdout')
+    args = parser.parse_args()
+
+    data = read_training_csv(args.csv)
+    results = []
+    for scale in args.scales:
+        scaled = FeatureStore.from_frame(synthesize(data, scale))
+
+        # Brute force is exact, so it is the reference for agreement
+        poly, scaler, reference = fit_model(scaled, 'brute')[:3]
+        queries = role_queries(scaled, poly, scaler)
+        expected = reference.predict(queries)
+
+        for backend in args.backends:
+            knn, result = benchmark(scaled, backend, queries, args.repeats)
+            result['rows'] = len(scaled)
+            result['scale'] = scale
+            result['agreement'] = round(float(np.mean(knn.predict(queries) == expected)), 4)
+            results.append(result)
+            if not args.output:
+                print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+
+from benchmarks.neighbor_backends import synthesize
+from loader import chunked, iter_json_documents
+
+# Startup, latency, throughput, contention and memory of the whole service on scaled-up copies of the shipped data:
+#     python -m benchmarks.service --store mongomock --scales 10 100 1000 --output results.json
+#     python -m benchmarks.service --store mongod --scales 10    (uses MONGO_URI and a throwaway database)
+# Every scale runs in a fresh interpreter so startup and memory are measured from a cold process.
+# mongomock is not thread-safe, so occasional 500s under concurrency show up in 'errors'; use mongod for real numbers.
+
+SEED_FILES = {
+    'available_laptops': 'Laptops.available_laptops.json',
+    'maintenance_data': 'Laptops.maintenance_data.json',
+    'onboarding_offboarding_data': 'Laptops.onboarding_offboarding_data.json',
+}
+BENCHMARK_DATABASE = 'laptops_benchmark'
+
+
+def percentiles(seconds):
+    latencies_ms = np.array(seconds) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 4),
+    }
+
+
+def write_training_csv(source, path, scale, seed):
+    data = pd.read_csv(source, thousands=',')
+    synthesize(data, scale, seed).to_csv(path, index=False)
+
+
+def seed_database(database, scale, chunk_size=1000):
+    # Every shipped laptop unit and maintenance record is repeated `scale` times; only the originals keep their holds
+    for name, path in SEED_FILES.items():
+        collection = database[name]
+        collection.drop()
+
+        def copies():
+            for document in iter_json_documents(path):
+                yield document
+                for _ in range(scale - 1):
+                    copy = dict(document, _id=ObjectId())
+                    copy.pop('Reserved', None)
+                    yield copy
+
+        for chunk in chunked(copies(), chunk_size):
+            collection.insert_many(chunk, ordered=False)
+
+
+def measure_startup():
+    from service import LaptopRecommendationModel
+
+    def construct():
+        # Subsystems are built lazily, so load the recommender and the reservation system explicitly
+        started = time.perf_counter()
+        model = LaptopRecommendationModel().load('recommender', 'reservation_system')
+        elapsed = time.perf_counter() - started
+        model.close()
+        return model, elapsed
+
+    # The first start fits the model and saves the artifact; the second only loads it
+    _, cold = construct()
+    _, warm = construct()
+
+    tracemalloc.start()
+    model, _ = construct()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return model, {
+        'startup_cold_seconds': round(cold, 4),
+        'startup_warm_seconds': round(warm, 4),
+        'startup_peak_alloc_mb': round(peak / 2 ** 20, 2),
+    }
+
+
+def measure_recommend(model, roles, repeats):
+    results = {}
+    ttl = model.response_cache.ttl
+    for label, cache_ttl in (('uncached', 0), ('cached', ttl or 30)):
+        model.response_cache.ttl = cache_ttl
+        model.response_cache.clear()
+        latencies = []
+        for _ in range(repeats):
+            for role in roles:
+                started = time.perf_counter()
+                model.recommend_laptop(role)
+                latencies.append(time.perf_counter() - started)
+        results[label] = percentiles(latencies)
+    model.response_cache.ttl = ttl
+    return results
+
+
+def measure_endpoint(app, path, payloads, clients):
+    # Each client thread gets its own test client and walks its share of the payloads
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def run(share):
+        nonlocal errors
+        client = app.test_client()
+        for payload in share:
+            started = time.perf_counter()
+            response = client.post(path, json=payload)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(run, [payloads[i::clients] for i in range(clients)]))
+    elapsed = time.perf_counter() - started
+
+    result = {'requests': len(payloads), 'errors': errors, 'requests_per_second': round(len(payloads) / elapsed, 2)}
+    result.update(percentiles(latencies))
+    return result
+
+
+def measure_contention(model, clients, quantity):
+    # Every client races for units of the most plentiful model at once
+    laptop_name = max(model.inventory.names(), key=model.inventory.available_count)
+    before = model.reservation_system.get_stats()
+    barrier = threading.Barrier(clients)
+
+    def run(index):
+        barrier.wait()
+        return model.reserve_laptops(laptop_name, f'contender-{index}', quantity)
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(run, range(clients)))
+
+    after = model.reservation_system.get_stats()
+    delta = {name: after[name] - before[name] for name in after}
+    delta['laptop_name'] = laptop_name
+    # Units lost to another contender between the lookup and the update, per unit requested (retries count again)
+    delta['conflicts_per_unit'] = round(delta['conflicts'] / (clients * quantity), 4)
+    return delta
+
+
+def run_scale(args):
+    # Runs inside the child process; the environment already points at this scale's data
+    import db
+    if args.store == 'mongomock':
+        import mongomock
+        client = mongomock.MongoClient()
+        db.MongoClient = lambda *a, **k: client
+    database = db.get_database()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    seed_database(database, args.scale)
+    write_training_csv(args.csv, os.environ['LAPTOP_TRAINING_CSV'], args.scale, args.seed)
+    result = {
+        'scale': args.scale,
+        'store': args.store,
+        'clients': args.clients,
+        'laptop_units': database['available_laptops'].estimated_document_count(),
+        'seed_seconds': round(time.perf_counter() - started, 4),
+    }
+
+    model, startup = measure_startup()
+    result.update(startup)
+    result['training_rows'] = len(model.recommender.state.features)
+
+    roles = sorted(model.recommender.state.recommendation_table)
+    result['recommend_laptop'] = measure_recommend(model, roles, args.repeats)
+
+    # api.py builds its own model at import time, from the artifact saved above
+    import api
+    laptop_names = api.model.inventory.names()
+    n = args.requests
+    payloads = {
+        '/recommend': [{'role': rng.choice(roles)} for _ in range(n)],
+        '/check': [{'laptop_name': rng.choice(laptop_names)} for _ in range(n)],
+        '/reserve': [{'laptop_name': rng.choice(laptop_names), 'manager_name': f'manager-{i}'} for i in range(n)],
+        '/onboard': [{'employee_id': f'bench-{i}', 'name': f'Employee {i}', 'role': rng.choice(roles)} for i in range(n)],
+    }
+    before = api.model.reservation_system.get_stats()
+    result['endpoints'] = {path: measure_endpoint(api.app, path, body, args.clients) for path, body in payloads.items()}
+    after = api.model.reservation_system.get_stats()
+    result['endpoints']['/reserve']['rejections'] = after['rejections'] - before['rejections']
+    result['response_cache'] = api.model.response_cache.get_stats()
+
+    result['reservation_contention'] = measure_contention(api.model, args.clients, args.quantity)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['max_rss_mb'] = round(rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 2)
+
+    if args.store == 'mongod':
+        db.get_client().drop_database(db.DATABASE_NAME)
+    return result
+
+
+def spawn(args, scale, workdir):
+    # A fresh interpreter per scale, with its own training CSV, artifact and database
+    env = dict(os.environ)
+    env.update({
+        'LAPTOP_TRAINING_CSV': os.path.join(workdir, f'train_{scale}.csv'),
+        'LAPTOP_MODEL_ARTIFACT': os.path.join(workdir, f'model_{scale}.joblib'),
+        'RESPONSE_CACHE_SQLITE_PATH': os.path.join(workdir, f'cache_{scale}.sqlite3'),
+        'INCREMENTAL_TRAINING_SECONDS': '0',
+        'RESERVATION_SWEEP_SECONDS': '0',
+    })
+    if args.store == 'mongod':
+        env['MONGO_DATABASE'] = f'{BENCHMARK_DATABASE}_{scale}'
+    command = [sys.executable, '-m', 'benchmarks.service', '--child', '--csv', os.path.abspath(args.csv),
+               '--store', args.store, '--scales', str(scale),
+               '--clients', str(args.clients), '--requests', str(args.requests), '--repeats', str(args.repeats),
+               '--quantity', str(args.quantity), '--seed', str(args.seed)]
+    output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark and load-test the recommendation and reservation paths.')
+    parser.add_argument('--csv', default='train_laptops.csv', help='training data CSV to scale up')
+    parser.add_argument('--store', choices=['mongomock', 'mongod'], default='mongomock',
+                        help='in-process mongomock, or the mongod at MONGO_URI')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100], help='catalog and training set multipliers')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients per endpoint')
+    parser.add_argument('--requests', type=int, default=400, help='requests per endpoint')
+    parser.add_argument('--repeats', type=int, default=20, help='passes over all roles for recommend_laptop latency')
+    parser.add_argument('--quantity', type=int, default=2, help='units each contender reserves at once')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write results as JSON to this file instead of stdout')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.scale = args.scales[0]
+        print(json.dumps(run_scale(args)))
+        sys.exit(0)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='laptop-benchmark-') as workdir:
+        for scale in args.scales:
+            result = spawn(args, scale, workdir)
+            result['python'] = platform.python_version()
+            results.append(result)
+            if not args.output:
+                print(json.dumps(result))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
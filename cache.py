@@ -0,0 +1,224 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# How long cached responses are served before they are recomputed (0 disables the cache)
+CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 30))
+# Least recently used entries are dropped beyond this many
+CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+# 'memory' keeps the cache per process; 'sqlite' shares it between the workers on one host
+CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+CACHE_SQLITE_PATH = os.environ.get('RESPONSE_CACHE_SQLITE_PATH', 'response_cache.sqlite3')
+
+# Recommendations depend on the whole inventory and the model; reservation checks on one laptop model
+INVENTORY_TAG = 'inventory'
+MODEL_TAG = 'model'
+
+
+def laptop_tag(laptop_name):
+    # The only tag a reservation check depends on, so writes to other models leave it cached
+    return f'laptop:{laptop_name}'
+
+
+def laptop_tags(laptop_names):
+    # What a write to these models bumps: their own tags and, for the recommendations, the inventory
+    return [INVENTORY_TAG] + [laptop_tag(name) for name in sorted(set(laptop_names))]
+
+
+class MemoryBackend:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.tags = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        # Returns how many entries were evicted to make room
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            evicted = 0
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def tag_versions(self, tags):
+        with self.lock:
+            return [self.tags.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        with self.lock:
+            for tag in tags:
+                self.tags[tag] = self.tags.get(tag, 0) + 1
+
+    def size(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SqliteBackend:
+    def __init__(self, max_entries, path=CACHE_SQLITE_PATH):
+        # Every worker process opens the same file, so entries and tag versions are shared
+        self.max_entries = max_entries
+        self.path = path
+        self.local = threading.local()
+        self.touched = {}
+        self.touched_lock = threading.Lock()
+        with self.connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                               '(key TEXT PRIMARY KEY, value TEXT, expires_at REAL, tags TEXT, used_at REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS tags (name TEXT PRIMARY KEY, version INTEGER)')
+
+    def connection(self):
+        # sqlite3 connections cannot cross threads or forks
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self.connection().execute('SELECT value, expires_at, tags FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        # Reads stay read-only so they never take the write lock; the LRU touch waits for the next put
+        with self.touched_lock:
+            self.touched[key] = time.time()
+        return json.loads(row[0]), row[1], json.loads(row[2])
+
+    def put(self, key, entry):
+        value, expires_at, tags = entry
+        with self.touched_lock:
+            touched, self.touched = self.touched, {}
+        connection = self.connection()
+        if touched:
+            connection.executemany('UPDATE entries SET used_at = ? WHERE key = ?',
+                                   [(used_at, touched_key) for touched_key, used_at in touched.items()])
+        connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                           (key, json.dumps(value), expires_at, json.dumps(tags), time.time()))
+        overflow = self.size() - self.max_entries
+        if overflow <= 0:
+            return 0
+        connection.execute('DELETE FROM entries WHERE key IN '
+                           '(SELECT key FROM entries ORDER BY used_at LIMIT ?)', (overflow,))
+        return overflow
+
+    def delete(self, key):
+        self.connection().execute('DELETE FROM entries WHERE key = ?', (key,))
+
+    def tag_versions(self, tags):
+        rows = dict(self.connection().execute(
+            f"SELECT name, version FROM tags WHERE name IN ({','.join('?' * len(tags))})", list(tags)).fetchall())
+        return [rows.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        self.connection().executemany(
+            'INSERT INTO tags VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET version = version + 1',
+            [(tag,) for tag in tags])
+
+    def size(self):
+        return self.connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def clear(self):
+        self.connection().execute('DELETE FROM entries')
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'sqlite': SqliteBackend,
+}
+
+
+class ResponseCache:
+    def __init__(self, backend=CACHE_BACKEND, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES):
+        # Entries remember the versions of the tags they depend on; writes bump those tags
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown response cache backend '{backend}'. Choose from {sorted(BACKENDS)}.")
+        self.backend = BACKENDS[backend](max_entries)
+        self.ttl = ttl
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidated': 0,
+            'expired': 0,
+            'evictions': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self.stats_lock:
+            self.stats[name] += amount
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['entries'] = self.backend.size()
+        return stats
+
+    def lookup(self, key, tags):
+        # (True, value) if the entry is fresh and none of its tags were bumped since it was stored
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, expires_at, versions = entry
+            if expires_at <= time.time():
+                self._count('expired')
+            elif versions != self.backend.tag_versions(tags):
+                self._count('invalidated')
+            else:
+                self._count('hits')
+                return True, value
+            self.backend.delete(key)
+        self._count('misses')
+        return False, None
+
+    def tag_versions(self, tags):
+        return self.backend.tag_versions(tags)
+
+    def store(self, key, value, versions):
+        evicted = self.backend.put(key, (value, time.time() + self.ttl, versions))
+        if evicted:
+            self._count('evictions', evicted)
+
+    def get_or_compute(self, key, tags, compute, cacheable=None):
+        if self.ttl <= 0:
+            return compute()
+        hit, value = self.lookup(key, tags)
+        if hit:
+            return value
+        # Versions are read before computing so a write that lands meanwhile invalidates the result
+        versions = self.tag_versions(tags)
+        value = compute()
+        if cacheable is None or cacheable(value):
+            self.store(key, value, versions)
+        return value
+
+    def bump(self, *tags):
+        if tags:
+            self.backend.bump(tags)
+
+    def clear(self):
+        self.backend.clear()
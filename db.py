@@ -0,0 +1,183 @@
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+
+from metrics import command_metrics, registry
+
+# Connection settings, overridable from the environment
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/')
+DATABASE_NAME = os.environ.get('MONGO_DATABASE', 'Laptops')
+MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000))
+WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000))
+
+
+class PoolStatistics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.open_connections = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+            self.pool_clears = 0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'open_connections': self.open_connections,
+                'checked_out': self.checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'total_wait_ms': round(self.total_wait_ms, 3),
+                'avg_wait_ms': round(self.total_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait_ms, 3),
+                'pool_clears': self.pool_clears,
+            }
+
+    def _record_wait(self, event):
+        # Checkout events carry the time spent waiting for a socket (seconds)
+        duration = getattr(event, 'duration', None)
+        if duration is not None:
+            wait_ms = duration * 1000
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open_connections -= 1
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self._record_wait(event)
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self.checkout_failures += 1
+            self._record_wait(event)
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.checked_out -= 1
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pool_clears += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+pool_statistics = PoolStatistics()
+registry.register_gauges('laptop_mongo_pool', 'MongoDB connection pool statistics.', pool_statistics.snapshot, 'stat')
+
+_client = None
+_client_pid = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # One MongoClient (and therefore one socket pool and one set of monitor threads) per process
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                # MongoClient is not fork-safe, so a forked child opens its own
+                pool_statistics.reset()
+                _client = MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MAX_POOL_SIZE,
+                    minPoolSize=MIN_POOL_SIZE,
+                    connectTimeoutMS=CONNECT_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                    socketTimeoutMS=SOCKET_TIMEOUT_MS,
+                    waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+                    event_listeners=[pool_statistics, command_metrics],
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_database():
+    return get_client()[DATABASE_NAME]
+
+
+def get_async_client():
+    # Async counterpart used by async_api.py; it shares the settings and pool statistics
+    global _async_client
+    if _async_client is None:
+        from pymongo import AsyncMongoClient
+        _async_client = AsyncMongoClient(
+            MONGO_URI,
+            maxPoolSize=MAX_POOL_SIZE,
+            minPoolSize=MIN_POOL_SIZE,
+            connectTimeoutMS=CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=SOCKET_TIMEOUT_MS,
+            waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+            event_listeners=[pool_statistics, command_metrics],
+        )
+    return _async_client
+
+
+def get_async_database():
+    return get_async_client()[DATABASE_NAME]
+
+
+def close_client():
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+def pool_stats():
+    stats = pool_statistics.snapshot()
+    stats.update({
+        'uri': MONGO_URI,
+        'database': DATABASE_NAME,
+        'max_pool_size': MAX_POOL_SIZE,
+        'min_pool_size': MIN_POOL_SIZE,
+        'connect_timeout_ms': CONNECT_TIMEOUT_MS,
+        'server_selection_timeout_ms': SERVER_SELECTION_TIMEOUT_MS,
+        'socket_timeout_ms': SOCKET_TIMEOUT_MS,
+        'wait_queue_timeout_ms': WAIT_QUEUE_TIMEOUT_MS,
+    })
+    return stats
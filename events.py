@@ -0,0 +1,259 @@
+import argparse
+import atexit
+import csv
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from db import get_database
+
+# Append-only history of every state change. Request handlers only enqueue; a background writer
+# stores the events in batches, so the log adds no round trip to the request path.
+#     python events.py replay --since 2026-01-01        # rebuild assignment, reservation and inventory state
+#     python events.py training-csv history.csv         # labelled rows for a full retrain with train.py
+EVENT_LOG_COLLECTION = os.environ.get('EVENT_LOG_COLLECTION', 'event_log')
+# Events waiting for the writer; when it falls this far behind, handlers block for up to the put timeout
+EVENT_LOG_MAX_QUEUED = int(os.environ.get('EVENT_LOG_MAX_QUEUED', 10000))
+EVENT_LOG_PUT_TIMEOUT_SECONDS = float(os.environ.get('EVENT_LOG_PUT_TIMEOUT_SECONDS', 1))
+# Largest insert_many the writer sends; under load it drains whatever has queued up to this many
+EVENT_LOG_BATCH_SIZE = int(os.environ.get('EVENT_LOG_BATCH_SIZE', 500))
+# Attempts per batch before its events are counted as dropped
+EVENT_LOG_MAX_ATTEMPTS = int(os.environ.get('EVENT_LOG_MAX_ATTEMPTS', 5))
+
+LAPTOP_ASSIGNED = 'laptop_assigned'
+LAPTOP_RETURNED = 'laptop_returned'
+RESERVATION_CREATED = 'reservation_created'
+RESERVATION_EXPIRED = 'reservation_expired'
+MAINTENANCE_UPDATED = 'maintenance_updated'
+TICKET_CREATED = 'ticket_created'
+TICKET_REPEATED = 'ticket_repeated'
+TICKET_UPDATED = 'ticket_updated'
+
+
+class EventLog:
+    def __init__(self, collection=None, max_queued=EVENT_LOG_MAX_QUEUED, batch_size=EVENT_LOG_BATCH_SIZE,
+                 put_timeout=EVENT_LOG_PUT_TIMEOUT_SECONDS):
+        self.collection = collection if collection is not None else get_database()[EVENT_LOG_COLLECTION]
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.closed = False
+        self.stop_event = threading.Event()
+
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'recorded': 0,
+            'written': 0,
+            'batches': 0,
+            'retries': 0,
+            'dropped': 0,
+            'blocked': 0,
+        }
+
+        self.collection.create_index([('at', ASCENDING)])
+        self.collection.create_index([('type', ASCENDING), ('at', ASCENDING)])
+        self.writer = threading.Thread(target=self._write_loop, name='event-log-writer', daemon=True)
+        self.writer.start()
+        # Whatever is still queued when the interpreter exits gets written first
+        atexit.register(self.close)
+
+    def _count(self, name, amount=1):
+        with self.stats_lock:
+            self.stats[name] += amount
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['queued'] = self.queue.qsize()
+        return stats
+
+    def record(self, event_type, **fields):
+        # The _id is fixed here, so a batch that is retried after a partial write cannot duplicate events
+        event = dict(fields, _id=ObjectId(), type=event_type, at=datetime.datetime.now())
+        self._count('recorded')
+        if self.closed:
+            self._write([event])
+            return
+        try:
+            self.queue.put_nowait(event)
+            return
+        except queue.Full:
+            self._count('blocked')
+        try:
+            # Backpressure: wait for the writer to make room rather than grow without bound
+            self.queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            # The writer cannot keep up (or MongoDB is unreachable); store this one inline instead of losing it
+            self._write([event])
+
+    def _write_loop(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write(self, batch):
+        for attempt in range(EVENT_LOG_MAX_ATTEMPTS):
+            if attempt:
+                self._count('retries')
+                time.sleep(min(0.1 * 2 ** attempt, 5))
+            try:
+                self.collection.insert_many(batch, ordered=False)
+                written = len(batch)
+            except BulkWriteError as e:
+                # Duplicate keys are events an earlier attempt already stored
+                errors = e.details.get('writeErrors', [])
+                if any(error.get('code') != 11000 for error in errors):
+                    continue
+                written = len(batch)
+            except PyMongoError:
+                continue
+            self._count('written', written)
+            self._count('batches')
+            return True
+        self._count('dropped', len(batch))
+        return False
+
+    def flush(self, timeout=None):
+        # Wait until everything recorded so far has been written (or given up on)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=30):
+        # Drain the queue and stop the writer; events recorded afterwards are written inline
+        if self.closed:
+            return
+        self.closed = True
+        self.stop_event.set()
+        self.writer.join(timeout)
+
+
+def replay(collection=None, since=None, until=None, types=None):
+    # Events in the order they happened, optionally limited to a time window and event types
+    if collection is None:
+        collection = get_database()[EVENT_LOG_COLLECTION]
+    query = {}
+    if since is not None or until is not None:
+        query['at'] = {}
+        if since is not None:
+            query['at']['$gte'] = since
+        if until is not None:
+            query['at']['$lt'] = until
+    if types:
+        query['type'] = {'$in': list(types)}
+    return collection.find(query).sort([('at', ASCENDING), ('_id', ASCENDING)])
+
+
+def _release_unit(reservations, unit_reservations, unit_id):
+    reservation_id = unit_reservations.pop(unit_id, None)
+    reservation = reservations.get(reservation_id)
+    if reservation is not None:
+        reservation['units'].discard(unit_id)
+        if not reservation['units']:
+            del reservations[reservation_id]
+
+
+def rebuild_state(events):
+    # Fold the log into the state it describes:
+    #     assignments   employee_id -> the laptop model they hold
+    #     reservations  reservation_id -> who holds how many units of which model, until when
+    #     inventory     laptop model -> units assigned and reserved
+    #     maintenance   laptop model -> last maintenance status set
+    assignments = {}
+    reservations = {}
+    unit_reservations = {}
+    maintenance = {}
+    for event in events:
+        event_type = event.get('type')
+        if event_type == LAPTOP_ASSIGNED:
+            assignments[event['employee_id']] = {
+                'laptop_name': event['laptop_name'], 'role': event.get('role'), 'assigned_at': event['at'],
+            }
+        elif event_type == LAPTOP_RETURNED:
+            current = assignments.get(event['employee_id'])
+            if current is not None and current['laptop_name'] == event['laptop_name']:
+                del assignments[event['employee_id']]
+        elif event_type == RESERVATION_CREATED:
+            # A lapsed hold can be taken over before the sweeper logs its expiry
+            for unit_id in event['unit_ids']:
+                _release_unit(reservations, unit_reservations, unit_id)
+                unit_reservations[unit_id] = event['reservation_id']
+            reservations[event['reservation_id']] = {
+                'laptop_name': event['laptop_name'], 'manager_name': event['manager_name'],
+                'units': set(event['unit_ids']), 'expires_at': event.get('expires_at'),
+            }
+        elif event_type == RESERVATION_EXPIRED:
+            _release_unit(reservations, unit_reservations, event['unit_id'])
+        elif event_type == MAINTENANCE_UPDATED:
+            maintenance[event['laptop_name']] = event['status']
+
+    inventory = {}
+    for assignment in assignments.values():
+        entry = inventory.setdefault(assignment['laptop_name'], {'assigned': 0, 'reserved': 0})
+        entry['assigned'] += 1
+    for reservation in reservations.values():
+        entry = inventory.setdefault(reservation['laptop_name'], {'assigned': 0, 'reserved': 0})
+        entry['reserved'] += len(reservation['units'])
+    return {'assignments': assignments, 'reservations': reservations, 'inventory': inventory, 'maintenance': maintenance}
+
+
+def training_rows(events, inventory):
+    # Every assignment in the log as a labelled training row; the laptop's specs stand in for the requirements
+    from incremental import history_row
+    rows = []
+    for event in events:
+        if event.get('type') != LAPTOP_ASSIGNED:
+            continue
+        row = history_row(event.get('role'), event.get('laptop_name'), inventory)
+        if row is not None:
+            rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay the event log.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = subparsers.add_parser('replay', help='print the state rebuilt from the log as JSON')
+    training_parser = subparsers.add_parser('training-csv', help='write the logged assignments as training CSV rows')
+    training_parser.add_argument('output')
+    for subparser in (replay_parser, training_parser):
+        subparser.add_argument('--since', type=datetime.datetime.fromisoformat, help='only events at or after this time')
+        subparser.add_argument('--until', type=datetime.datetime.fromisoformat, help='only events before this time')
+
+    args = parser.parse_args()
+    if args.command == 'replay':
+        state = rebuild_state(replay(since=args.since, until=args.until))
+        print(json.dumps(state, indent=2, default=lambda value: sorted(value) if isinstance(value, set) else str(value)))
+    else:
+        from inventory import InventoryIndex
+        inventory = InventoryIndex(get_database()['available_laptops'])
+        rows = training_rows(replay(since=args.since, until=args.until, types=[LAPTOP_ASSIGNED]), inventory)
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['Role', 'Required CPU Speed (GHz)', 'Required RAM (GB)',
+                                                   'Required Storage (GB)', 'Required GPU', 'Recommended Laptop'])
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} training rows to '{args.output}'.")
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Column order of FeatureStore.specs; with the role code in front these are the model's FEATURE_COLUMNS
+SPEC_COLUMNS = ['Required CPU Speed (GHz)', 'Required RAM (GB)', 'Required Storage (GB)']
+
+
+class Vocabulary:
+    def __init__(self, names):
+        # Code -> name is a list index, name -> code a dict lookup
+        self.names = list(names)
+        self.codes = {name: code for code, name in enumerate(self.names)}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.codes
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def code(self, name, default=None):
+        return self.codes.get(name, default)
+
+    def name(self, code, default=None):
+        code = int(code)
+        return self.names[code] if 0 <= code < len(self.names) else default
+
+    def encode(self, names):
+        return np.fromiter((self.codes[name] for name in names), dtype=np.int32, count=len(names))
+
+    def extended(self, names):
+        # New names get the next free codes so existing codes never move; returns self if nothing is new
+        new = [name for name in dict.fromkeys(names) if name not in self.codes]
+        return Vocabulary(self.names + new) if new else self
+
+
+class FeatureStore:
+    def __init__(self, roles, specs, laptops, role_vocabulary, laptop_vocabulary):
+        # One row per training example: int-coded role and laptop, float specs in SPEC_COLUMNS order
+        self.roles = np.ascontiguousarray(roles, dtype=np.int32)
+        self.specs = np.ascontiguousarray(specs, dtype=np.float64).reshape(-1, len(SPEC_COLUMNS))
+        self.laptops = np.ascontiguousarray(laptops, dtype=np.int32)
+        self.role_vocabulary = role_vocabulary
+        self.laptop_vocabulary = laptop_vocabulary
+
+        # Per-role aggregates: how many rows each role has and its mean requirements
+        self.role_counts = np.bincount(self.roles, minlength=len(role_vocabulary))
+        sums = np.zeros((len(role_vocabulary), len(SPEC_COLUMNS)))
+        np.add.at(sums, self.roles, self.specs)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.role_means = sums / self.role_counts[:, None]
+
+    @classmethod
+    def from_frame(cls, data):
+        # Roles and laptops are coded in sorted order, as pandas categories would be
+        role_vocabulary = Vocabulary(sorted(data['Role'].unique()))
+        laptop_vocabulary = Vocabulary(sorted(data['Recommended Laptop'].unique()))
+        return cls(
+            role_vocabulary.encode(data['Role'].tolist()),
+            data[SPEC_COLUMNS].to_numpy(dtype=np.float64),
+            laptop_vocabulary.encode(data['Recommended Laptop'].tolist()),
+            role_vocabulary,
+            laptop_vocabulary,
+        )
+
+    def __len__(self):
+        return len(self.roles)
+
+    def feature_matrix(self):
+        # (rows, 4) matrix in FEATURE_COLUMNS order: role code, CPU, RAM, storage
+        return np.column_stack([self.roles, self.specs])
+
+    def role_feature_matrix(self):
+        # Role codes present in the data and their mean requirements in the same layout
+        codes = np.flatnonzero(self.role_counts)
+        return codes, np.column_stack([codes, self.role_means[codes]])
+
+    def extended(self, role_names, specs, laptop_names):
+        # A new store with the rows appended; the old one is left untouched for in-flight readers
+        role_vocabulary = self.role_vocabulary.extended(role_names)
+        laptop_vocabulary = self.laptop_vocabulary.extended(laptop_names)
+        return FeatureStore(
+            np.concatenate([self.roles, role_vocabulary.encode(role_names)]),
+            np.vstack([self.specs, np.asarray(specs, dtype=np.float64).reshape(-1, len(SPEC_COLUMNS))]),
+            np.concatenate([self.laptops, laptop_vocabulary.encode(laptop_names)]),
+            role_vocabulary,
+            laptop_vocabulary,
+        )
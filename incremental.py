@@ -0,0 +1,96 @@
+import copy
+import os
+
+import numpy as np
+
+from features import SPEC_COLUMNS
+from neighbors import make_neighbors
+
+# How often the server pulls new onboarding records into the model (0 disables the background updates)
+INCREMENTAL_TRAINING_SECONDS = float(os.environ.get('INCREMENTAL_TRAINING_SECONDS', 0))
+
+# Assignments written by assign_laptop use snake_case keys; the seeded export uses display names
+ROLE_KEYS = ('role', 'Role')
+LAPTOP_KEYS = ('laptop_assigned', 'Laptop Assigned')
+
+
+def _first(document, keys):
+    for key in keys:
+        if document.get(key):
+            return document[key]
+    return None
+
+
+def history_row(role, laptop_name, inventory):
+    # One labelled training row for a laptop handed to someone in the role, or None if either is unknown
+    # The laptop's own specs stand in for the requirements that were met
+    laptop = inventory.get(laptop_name) if laptop_name else None
+    if not role or laptop is None:
+        return None
+    return {
+        'Role': role,
+        'Required CPU Speed (GHz)': float(laptop['cpu']),
+        'Required RAM (GB)': int(laptop['ram']),
+        'Required Storage (GB)': int(laptop['storage']),
+        'Required GPU': 'Yes' if laptop['gpu'] else 'No',
+        'Recommended Laptop': laptop_name,
+    }
+
+
+def fetch_history(collections, inventory, watermark=None, limit=None):
+    # Labelled (role, laptop specs) -> laptop rows from onboarding records newer than the watermark
+    # Active assignments and the offboarding archive keep their ObjectIds, so one watermark covers both
+    query = {'_id': {'$gt': watermark}} if watermark is not None else {}
+    documents = []
+    for collection in collections:
+        cursor = collection.find(query).sort('_id', 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        documents.extend(cursor)
+    documents.sort(key=lambda document: document['_id'])
+    if limit:
+        documents = documents[:limit]
+
+    rows = []
+    last_id = watermark
+    for document in documents:
+        last_id = document['_id']
+        row = history_row(_first(document, ROLE_KEYS), _first(document, LAPTOP_KEYS), inventory)
+        if row is not None:
+            rows.append(row)
+    return rows, last_id
+
+
+def update_artifact(artifact, rows, watermark):
+    # Return a new artifact with the rows folded in; the old one is left untouched for in-flight readers
+    updated = dict(artifact)
+
+    # New roles and laptops get the next free codes so existing codes never move
+    features = artifact['features'].extended(
+        [row['Role'] for row in rows],
+        [[row[column] for column in SPEC_COLUMNS] for row in rows],
+        [row['Recommended Laptop'] for row in rows],
+    )
+    X_new_poly = artifact['poly'].transform(features.feature_matrix()[-len(rows):])
+    y_new = features.laptops[-len(rows):]
+
+    # Fold the new rows into the running mean/variance instead of refitting the scaler
+    scaler = copy.deepcopy(artifact['scaler'])
+    scaler.partial_fit(X_new_poly)
+
+    X_train_poly = np.vstack([artifact['X_train_poly'], X_new_poly])
+    y_train = np.concatenate([artifact['y_train'], y_new])
+
+    # Rebuilding the neighbour index is a vectorised rescale plus an index build; brute force only stores the rows
+    knn = make_neighbors(artifact['neighbor_backend'], n_neighbors=artifact['knn'].n_neighbors)
+    knn.fit(scaler.transform(X_train_poly), y_train)
+
+    updated.update({
+        'features': features,
+        'scaler': scaler,
+        'knn': knn,
+        'X_train_poly': X_train_poly,
+        'y_train': y_train,
+        'history_watermark': watermark,
+    })
+    return updated
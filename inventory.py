@@ -0,0 +1,177 @@
+import os
+import threading
+
+from pymongo.errors import PyMongoError
+
+from cache import laptop_tags
+
+# Without change streams (a standalone server) the index is reloaded this often to pick up other processes' writes
+INVENTORY_RELOAD_SECONDS = float(os.environ.get('INVENTORY_RELOAD_SECONDS', 30))
+
+
+class InventoryIndex:
+    def __init__(self, collection, cache=None):
+        # In-memory index of the available_laptops collection keyed by laptop name
+        self.collection = collection
+        # Cached responses built from the index are invalidated whenever it changes under them
+        self.cache = cache
+        self.lock = threading.RLock()
+        self.laptops = {}
+        self.unit_names = {}
+        self.version = 0
+        self.listeners = []
+        self.watcher = None
+        self.stop_event = threading.Event()
+        self.load()
+
+    def load(self):
+        # Rebuild the whole index from MongoDB
+        laptops = {}
+        unit_names = {}
+        for document in self.collection.find({}):
+            self._add_unit(laptops, unit_names, document)
+        with self.lock:
+            changed = [name for name in set(laptops) | set(self.laptops) if laptops.get(name) != self.laptops.get(name)]
+            if not changed:
+                return
+            self.laptops = laptops
+            self.unit_names = unit_names
+            self.version += 1
+        if self.cache is not None:
+            self.cache.bump(*laptop_tags(changed))
+
+    def _add_unit(self, laptops, unit_names, document):
+        name = document.get('Laptop Name')
+        if name is None:
+            return
+        entry = laptops.get(name)
+        if entry is None:
+            entry = {
+                'Laptop Name': name,
+                'gpu': document.get('Required GPU') == 'Yes',
+                'cpu': document.get('Required CPU Speed (GHz)'),
+                'ram': document.get('Required RAM (GB)'),
+                'storage': document.get('Required Storage (GB)'),
+                'units': {},
+                'assigned': {},
+                # Kept up to date unit by unit so stock questions never scan the units
+                'free': 0,
+                'reserved': 0,
+            }
+            laptops[name] = entry
+        unit_id = document['_id']
+        reserved = document.get('Reserved') or {}
+        entry['units'][unit_id] = reserved.get('reserved_by')
+        # Units handed out to employees are tracked apart from reservations
+        # Any Assigned value takes the unit out of stock, matching the 'Assigned': None free test of the claims
+        assigned = document.get('Assigned')
+        if assigned is not None:
+            entry['assigned'][unit_id] = (assigned or {}).get('employee_id')
+        self._count_unit(entry, unit_id, 1)
+        unit_names[unit_id] = name
+        return name
+
+    def _count_unit(self, entry, unit_id, sign):
+        if entry['units'][unit_id]:
+            entry['reserved'] += sign
+        elif unit_id not in entry['assigned']:
+            entry['free'] += sign
+
+    def _remove_unit(self, unit_id):
+        name = self.unit_names.pop(unit_id, None)
+        if name is None:
+            return None
+        entry = self.laptops[name]
+        self._count_unit(entry, unit_id, -1)
+        entry['units'].pop(unit_id, None)
+        entry['assigned'].pop(unit_id, None)
+        if not entry['units']:
+            del self.laptops[name]
+        return name
+
+    def add_listener(self, listener):
+        # listener(version, names) runs under the index lock after every single-unit change, so a reader of the
+        # index can patch what it derived for those models instead of rebuilding it; load() notifies nobody
+        self.listeners.append(listener)
+
+    def _changed(self, names):
+        self.version += 1
+        names = {name for name in names if name is not None}
+        for listener in self.listeners:
+            listener(self.version, names)
+
+    def apply_document(self, document):
+        # Insert or replace a single laptop unit, e.g. after a reservation
+        with self.lock:
+            removed = self._remove_unit(document['_id'])
+            added = self._add_unit(self.laptops, self.unit_names, document)
+            self._changed([removed, added])
+
+    def remove_document(self, unit_id):
+        with self.lock:
+            self._changed([self._remove_unit(unit_id)])
+
+    def get(self, laptop_name):
+        return self.laptops.get(laptop_name)
+
+    def names(self):
+        return list(self.laptops)
+
+    def available_count(self, laptop_name):
+        entry = self.laptops.get(laptop_name)
+        return entry['free'] if entry is not None else 0
+
+    def start_watching(self):
+        # Follow the collection's change stream; only works against a replica set
+        if self.watcher is not None:
+            return
+        self.stop_event.clear()
+        self.watcher = threading.Thread(target=self._watch, name='inventory-change-stream', daemon=True)
+        self.watcher.start()
+
+    def stop_watching(self):
+        self.stop_event.set()
+        self.watcher = None
+
+    def _watch(self):
+        try:
+            with self.collection.watch(full_document='updateLookup', max_await_time_ms=1000) as stream:
+                # Catch up on anything that changed before the stream was opened
+                self.load()
+                while not self.stop_event.is_set() and stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        self.apply_change(change)
+        except (PyMongoError, NotImplementedError, TypeError):
+            # Standalone servers (and mongomock) have no change streams; write-through hooks cover this process
+            # and a periodic reload catches up with the others
+            self._poll(INVENTORY_RELOAD_SECONDS)
+
+    def _poll(self, interval):
+        if interval <= 0:
+            return
+        while not self.stop_event.wait(interval):
+            try:
+                self.load()
+            except PyMongoError:
+                # Keep the current index and try again on the next tick
+                pass
+
+    def apply_change(self, change):
+        # A change made by another process; unlike our own writes, nothing else has bumped its cache tags
+        operation = change.get('operationType')
+        names = []
+        if operation in ('insert', 'update', 'replace', 'delete'):
+            unit_id = change['documentKey']['_id']
+            names.append(self.unit_names.get(unit_id))
+            document = change.get('fullDocument')
+            if operation == 'delete' or document is None:
+                self.remove_document(unit_id)
+            else:
+                self.apply_document(document)
+                names.append(document.get('Laptop Name'))
+        elif operation in ('drop', 'rename', 'invalidate'):
+            self.load()
+        names = [name for name in names if name is not None]
+        if self.cache is not None and names:
+            self.cache.bump(*laptop_tags(names))
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+
+from bson import json_util
+from pymongo import InsertOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from db import get_database
+
+# Seed or snapshot the Laptops database with constant memory:
+#     python loader.py import Laptops.available_laptops.json Laptops.maintenance_data.json
+#     python loader.py export available_laptops fleet_snapshot.json
+
+CHUNK_SIZE = int(os.environ.get('LOADER_CHUNK_SIZE', 1000))
+READ_SIZE = 1 << 16
+
+
+def collection_for(path):
+    # Laptops.available_laptops.json -> available_laptops
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.split('.', 1)[1] if '.' in stem else stem
+
+
+def iter_json_documents(path):
+    # Stream the elements of a JSON array (or newline-delimited JSON) without loading the file
+    decoder = json.JSONDecoder(object_hook=json_util.object_hook)
+    with open(path, encoding='utf-8-sig') as f:
+        buffer = ''
+        position = 0
+        eof = False
+        while True:
+            # Skip whitespace and the array punctuation between documents
+            while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+                position += 1
+            if position >= len(buffer):
+                if eof:
+                    return
+                buffer = f.read(READ_SIZE)
+                position = 0
+                eof = not buffer
+                continue
+            try:
+                document, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The document is cut off at the end of the buffer; read more and retry
+                if eof:
+                    raise
+                more = f.read(READ_SIZE)
+                eof = not more
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield document
+            position = end
+
+
+def chunked(documents, size):
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_file(path, collection_name=None, chunk_size=CHUNK_SIZE, drop=False):
+    # The training CSV is read from disk by train.py (LAPTOP_TRAINING_CSV), which checksums the file itself
+    if path.endswith('.csv'):
+        raise ValueError(f"'{path}' is a CSV file; the model trains from LAPTOP_TRAINING_CSV, not from MongoDB.")
+    collection = get_database()[collection_name or collection_for(path)]
+    if drop:
+        collection.drop()
+    documents = iter_json_documents(path)
+
+    written = 0
+    failed = 0
+    for chunk in chunked(documents, chunk_size):
+        # Documents with an _id are upserted so re-running a seed is idempotent
+        requests = [
+            ReplaceOne({'_id': document['_id']}, document, upsert=True) if '_id' in document else InsertOne(document)
+            for document in chunk
+        ]
+        try:
+            result = collection.bulk_write(requests, ordered=False)
+            written += result.inserted_count + result.upserted_count + result.matched_count
+        except BulkWriteError as e:
+            details = e.details
+            written += details.get('nInserted', 0) + details.get('nUpserted', 0) + details.get('nMatched', 0)
+            failed += len(details.get('writeErrors', []))
+    return written, failed
+
+
+def export_collection(collection_name, path, query=None, chunk_size=CHUNK_SIZE, lines=False):
+    # Write the collection as a JSON array (or JSON lines) one document at a time
+    collection = get_database()[collection_name]
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        if not lines:
+            f.write('[')
+        for document in collection.find(query or {}).batch_size(chunk_size):
+            text = json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS)
+            if lines:
+                f.write(text + '\n')
+            else:
+                f.write((',\n' if count else '\n') + text)
+            count += 1
+        if not lines:
+            f.write('\n]\n')
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bulk import and export of the Laptops collections.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='stream JSON/JSON lines files into MongoDB')
+    import_parser.add_argument('files', nargs='+')
+    import_parser.add_argument('--collection', help='target collection (default: derived from the file name)')
+    import_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    import_parser.add_argument('--drop', action='store_true', help='drop the collection before importing')
+
+    export_parser = subparsers.add_parser('export', help='stream a collection to a file')
+    export_parser.add_argument('collection')
+    export_parser.add_argument('output')
+    export_parser.add_argument('--query', default='{}', help='Extended JSON filter')
+    export_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    export_parser.add_argument('--lines', action='store_true', help='write JSON lines instead of an array')
+
+    args = parser.parse_args()
+    if args.command == 'import':
+        for path in args.files:
+            if path.endswith('.csv'):
+                parser.error(f"'{path}' is a CSV file; point LAPTOP_TRAINING_CSV at it instead of importing it.")
+        for path in args.files:
+            collection_name = args.collection or collection_for(path)
+            written, failed = import_file(path, collection_name, args.chunk_size, args.drop)
+            print(f"Imported {written} documents from '{path}' into '{collection_name}' ({failed} failed).")
+    else:
+        count = export_collection(args.collection, args.output, json_util.loads(args.query), args.chunk_size, args.lines)
+        print(f"Exported {count} documents from '{args.collection}' to '{args.output}'.")
@@ -0,0 +1,149 @@
+import datetime
+import os
+import threading
+import time
+
+import numpy as np
+
+from cache import INVENTORY_TAG
+from db import get_database
+from events import MAINTENANCE_UPDATED
+
+# How long fleet scores are reused before maintenance_data is read again
+MAINTENANCE_CACHE_SECONDS = float(os.environ.get('MAINTENANCE_CACHE_SECONDS', 300))
+# Machines due within this many days count as "about to be serviced"
+MAINTENANCE_DUE_SOON_DAYS = int(os.environ.get('MAINTENANCE_DUE_SOON_DAYS', 14))
+# Whether recommendations skip laptop models whose every unit is due for service
+MAINTENANCE_SKIP_DUE = os.environ.get('MAINTENANCE_SKIP_DUE', 'no').lower() in ('1', 'yes', 'true')
+
+# Stored statuses raise the score even if the schedule says the machine is fine
+STATUS_RISK = {'Needs Inspection': 0.8, 'Needs Maintenance': 1.0}
+
+
+def _to_day(value):
+    # Dates arrive as 'YYYY-MM-DD' strings from the JSON export or as datetimes from Mongo
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, str):
+        try:
+            return datetime.date.fromisoformat(value[:10]).isoformat()
+        except ValueError:
+            return 'NaT'
+    return 'NaT'
+
+
+class PredictiveMaintenance:
+    def __init__(self, cache=None, events=None):
+        # Use the shared MongoDB connection pool
+        self.db = get_database()
+        self.cache = cache
+        self.events = events
+        self.collection = self.db['maintenance_data']
+        self.lock = threading.Lock()
+        self.fleet = None
+        self.loaded_at = 0.0
+
+    def load(self):
+        # Read the whole collection into columnar arrays and score it in one pass
+        records = list(self.collection.find({}, {'_id': 0, 'Laptop Name': 1, 'Maintenance Status': 1,
+                                                 'Last Maintenance Date': 1, 'Next Maintenance Due': 1}))
+        names = np.array([record.get('Laptop Name') for record in records], dtype=object)
+        statuses = np.array([record.get('Maintenance Status', 'No data available') for record in records], dtype=object)
+        last = np.array([_to_day(record.get('Last Maintenance Date')) for record in records], dtype='datetime64[D]')
+        due = np.array([_to_day(record.get('Next Maintenance Due')) for record in records], dtype='datetime64[D]')
+
+        today = np.datetime64(datetime.date.today().isoformat(), 'D')
+        days_until_due = np.where(np.isnat(due), np.nan, (due - today).astype(float))
+        interval = np.where(np.isnat(due) | np.isnat(last), np.nan, (due - last).astype(float))
+
+        # Risk is the fraction of the service interval already used up: 1.0 means due today
+        with np.errstate(divide='ignore', invalid='ignore'):
+            risk = np.where(interval > 0, 1 - days_until_due / interval, np.nan)
+        for status, floor in STATUS_RISK.items():
+            risk = np.where(statuses == status, np.fmax(risk, floor), risk)
+
+        state = np.full(len(records), 'OK', dtype=object)
+        state[days_until_due <= MAINTENANCE_DUE_SOON_DAYS] = 'Due soon'
+        state[days_until_due < 0] = 'Overdue'
+        state[np.isnat(due)] = 'Unknown'
+
+        # A model is serviceable if at least one of its machines is neither due nor flagged
+        unit_ok = (state != 'Due soon') & (state != 'Overdue') & ~np.isin(statuses, list(STATUS_RISK))
+        unique_names, inverse = np.unique(names.astype(str), return_inverse=True)
+        model_ok = np.zeros(len(unique_names), dtype=bool)
+        np.logical_or.at(model_ok, inverse, unit_ok)
+
+        fleet = {
+            'names': names,
+            'statuses': statuses,
+            'last_maintenance': last,
+            'next_due': due,
+            'days_until_due': days_until_due,
+            'risk': risk,
+            'state': state,
+            'rows': {},
+            'serviceable': dict(zip(unique_names.tolist(), model_ok.tolist())),
+        }
+        for row, name in enumerate(names):
+            fleet['rows'].setdefault(name, row)
+
+        with self.lock:
+            self.fleet = fleet
+            self.loaded_at = time.monotonic()
+        return fleet
+
+    def get_fleet(self):
+        # Cached fleet scores, reloaded once they are older than MAINTENANCE_CACHE_SECONDS
+        fleet = self.fleet
+        if fleet is None or time.monotonic() - self.loaded_at > MAINTENANCE_CACHE_SECONDS:
+            fleet = self.load()
+        return fleet
+
+    def invalidate(self):
+        with self.lock:
+            self.fleet = None
+
+    def fleet_report(self, state=None):
+        fleet = self.get_fleet()
+        report = []
+        for row in np.argsort(-np.nan_to_num(fleet['risk'], nan=-1), kind='stable'):
+            if state and fleet['state'][row] != state:
+                continue
+            risk = fleet['risk'][row]
+            report.append({
+                'laptop_name': fleet['names'][row],
+                'maintenance_status': fleet['statuses'][row],
+                'last_maintenance_date': str(fleet['last_maintenance'][row]),
+                'next_maintenance_due': str(fleet['next_due'][row]),
+                'days_until_due': None if np.isnan(fleet['days_until_due'][row]) else int(fleet['days_until_due'][row]),
+                'risk': None if np.isnan(risk) else round(float(risk), 3),
+                'state': fleet['state'][row],
+            })
+        return report
+
+    def predict_maintenance(self, laptop_name):
+        # Served from the cached fleet arrays instead of a find_one per call
+        fleet = self.get_fleet()
+        row = fleet['rows'].get(laptop_name)
+        if row is None:
+            return 'No data available'
+        return fleet['statuses'][row]
+
+    def update_maintenance_status(self, laptop_name, new_status):
+        # Update the maintenance status in MongoDB
+        result = self.collection.update_one(
+            {'Laptop Name': laptop_name},
+            {'$set': {'Maintenance Status': new_status, 'last_updated': datetime.datetime.now()}}
+        )
+        if result.modified_count > 0:
+            self.invalidate()
+            if self.cache is not None:
+                # Skipping models that are due for service changes what gets recommended
+                self.cache.bump(INVENTORY_TAG)
+            if self.events is not None:
+                self.events.record(MAINTENANCE_UPDATED, laptop_name=laptop_name, status=new_status)
+            return 'Maintenance status updated successfully.'
+        else:
+            return 'Failed to update maintenance status.'
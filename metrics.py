@@ -0,0 +1,216 @@
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from pymongo import monitoring
+
+# Latency buckets in seconds, from sub-millisecond cache hits up to slow Mongo writes
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Start the sampling profiler with the process (it can also be toggled at runtime)
+PROFILER_ENABLED = os.environ.get('METRICS_PROFILER', 'no').lower() in ('1', 'yes', 'true')
+PROFILER_INTERVAL_SECONDS = float(os.environ.get('METRICS_PROFILER_INTERVAL_SECONDS', 0.01))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = collections.defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            self.values[key] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # Per label set: cumulative bucket counts, observation count and sum
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][index] += 1
+            counts[1] += 1
+            counts[2] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, (buckets, count, total) in sorted(self.values.items()):
+                for bound, bucket_count in zip(self.buckets, buckets):
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, [("le", bound)])} {bucket_count}')
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {total}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        # Pull-style gauges read at scrape time: name -> (documentation, callback, label name)
+        self.collectors = {}
+
+    def _register(self, metric):
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def register_gauges(self, name, documentation, callback, label='name'):
+        # callback() returns {label value: number}; registering the same name again replaces it
+        with self.lock:
+            self.collectors[name] = (documentation, callback, label)
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = dict(self.collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, (documentation, callback, label) in sorted(collectors.items()):
+            try:
+                values = callback()
+            except Exception:
+                # A failing source must not take the whole scrape down
+                continue
+            lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} gauge'])
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'{name}{_format_labels((label,), (key,))} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram('laptop_stage_seconds', 'Time spent in each stage of a request.', ('stage',))
+MONGO_COMMAND_SECONDS = registry.histogram('laptop_mongo_command_seconds', 'MongoDB command latency.',
+                                           ('command', 'outcome'))
+RECOMMENDATIONS = registry.counter('laptop_recommendations_total', 'Recommendations by outcome.', ('outcome',))
+INCREMENTAL_TRAINING_FAILURES = registry.counter('laptop_incremental_training_failures_total',
+                                                 'Background model updates that raised.')
+HTTP_REQUEST_SECONDS = registry.histogram('laptop_http_request_seconds', 'HTTP request latency.',
+                                          ('endpoint', 'method', 'status'))
+
+
+def stage(name):
+    # with stage('knn'): ... records the block's duration under laptop_stage_seconds{stage="knn"}
+    return STAGE_SECONDS.time(stage=name)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    # Events already carry the round-trip duration, so nothing is kept between started and finished
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome='succeeded')
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome='failed')
+
+
+command_metrics = CommandMetrics()
+
+
+class SamplingProfiler:
+    def __init__(self, interval=PROFILER_INTERVAL_SECONDS):
+        # Samples every thread's stack and counts them in collapsed ("folded") form for flame graphs
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.samples = collections.Counter()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sample_loop, name='sampling-profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread = None
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                    frame = frame.f_back
+                with self.lock:
+                    self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        # One "frame;frame;frame count" line per distinct stack, hottest first
+        with self.lock:
+            return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common()) + '\n'
+
+
+profiler = SamplingProfiler()
+if PROFILER_ENABLED:
+    profiler.start()
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import KNeighborsClassifier
+
+# 'auto' keeps scikit-learn's own choice; see make_neighbors for the others
+NEIGHBOR_BACKEND = os.environ.get('LAPTOP_NEIGHBOR_BACKEND', 'auto')
+NEIGHBOR_BACKENDS = ('auto', 'brute', 'kd_tree', 'ball_tree', 'approximate')
+
+
+def make_neighbors(backend=NEIGHBOR_BACKEND, n_neighbors=5):
+    # Build an unfitted k-NN classifier for the requested backend
+    if backend not in NEIGHBOR_BACKENDS:
+        raise ValueError(f"Unknown neighbor backend '{backend}'. Choose one of: {', '.join(NEIGHBOR_BACKENDS)}.")
+    if backend == 'approximate':
+        return ApproximateNeighborsClassifier(n_neighbors=n_neighbors)
+    return KNeighborsClassifier(n_neighbors=n_neighbors, algorithm=backend)
+
+
+class ApproximateNeighborsClassifier:
+    # Inverted-file (IVF) k-NN: training points are bucketed by k-means centroid and a
+    # query only scans the buckets of its n_probe closest centroids. Exposes the subset
+    # of the KNeighborsClassifier interface the model uses (fit, predict, predict_proba,
+    # kneighbors, classes_).
+
+    def __init__(self, n_neighbors=5, n_lists=None, n_probe=8, random_state=42):
+        self.n_neighbors = n_neighbors
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        self.classes_, y_codes = np.unique(np.asarray(y), return_inverse=True)
+
+        # About sqrt(n) buckets keeps both the centroid scan and the bucket scan small
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(X))))
+        n_lists = min(n_lists, len(X))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3)
+        labels = kmeans.fit_predict(X)
+        self.centroids_ = kmeans.cluster_centers_
+
+        # Store the points grouped by bucket so each bucket is one contiguous slice
+        order = np.argsort(labels, kind='stable')
+        self._fit_X = X[order]
+        self._y = y_codes[order]
+        self.list_offsets_ = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        return self
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        X = np.asarray(X, dtype=np.float64)
+        k = n_neighbors or self.n_neighbors
+        n_probe = min(self.n_probe, len(self.centroids_))
+
+        # Rank the buckets for every query at once
+        centroid_distances = ((X[:, None, :] - self.centroids_[None, :, :]) ** 2).sum(axis=2)
+        probe_order = np.argsort(centroid_distances, axis=1)
+
+        distances = np.empty((len(X), k))
+        indices = np.empty((len(X), k), dtype=np.intp)
+        for row, query in enumerate(X):
+            # Widen the probe until there are at least k candidates
+            probes = n_probe
+            while True:
+                buckets = probe_order[row, :probes]
+                candidates = np.concatenate([np.arange(self.list_offsets_[b], self.list_offsets_[b + 1]) for b in buckets])
+                if len(candidates) >= k or probes >= len(self.centroids_):
+                    break
+                probes *= 2
+            candidate_distances = np.sqrt(((self._fit_X[candidates] - query) ** 2).sum(axis=1))
+            nearest = np.argsort(candidate_distances, kind='stable')[:k]
+            distances[row, :len(nearest)] = candidate_distances[nearest]
+            indices[row, :len(nearest)] = candidates[nearest]
+
+        if return_distance:
+            return distances, indices
+        return indices
+
+    def predict_proba(self, X):
+        # Uniform vote over the k neighbours, like KNeighborsClassifier(weights='uniform')
+        indices = self.kneighbors(X, return_distance=False)
+        votes = self._y[indices]
+        probabilities = np.zeros((len(votes), len(self.classes_)))
+        for column in range(votes.shape[1]):
+            np.add.at(probabilities, (np.arange(len(votes)), votes[:, column]), 1)
+        return probabilities / votes.shape[1]
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
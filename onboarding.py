@@ -0,0 +1,249 @@
+import datetime
+import uuid
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from cache import laptop_tags
+from db import get_client, get_database
+from events import LAPTOP_ASSIGNED, LAPTOP_RETURNED
+
+
+def supports_transactions(client):
+    # Multi-document transactions need a replica set or a sharded cluster
+    description = getattr(client, 'topology_description', None)
+    return description is not None and description.topology_type_name in ('ReplicaSetWithPrimary', 'Sharded')
+
+
+class OnboardingOffboarding:
+    def __init__(self, inventory=None, cache=None, events=None):
+        # Use the shared MongoDB connection pool
+        self.client = get_client()
+        self.db = get_database()
+        # Offboarded assignments stay here as 'Archived' records for auditing and retraining
+        # (older ones were moved to offboarding_archive, which the history reader still includes)
+        self.collection = self.db['onboarding_offboarding_data']
+        self.laptops = self.db['available_laptops']
+        self.inventory = inventory
+        self.cache = cache
+        self.events = events
+        self.collection.create_index([('employee_id', 1), ('laptop_assigned', 1), ('status', 1)])
+        self.laptops.create_index([('Assigned.employee_id', 1)], sparse=True)
+
+    def _run(self, work):
+        # Run the work in a transaction when the deployment supports one
+        if supports_transactions(self.client):
+            with self.client.start_session() as session:
+                return session.with_transaction(lambda s: work(s))
+        return work(None)
+
+    def _write_through(self, documents, laptop_names):
+        # Keep the inventory index and cached responses in step with the units a write just returned
+        if self.inventory is not None:
+            for document in documents:
+                self.inventory.apply_document(document)
+        if self.cache is not None:
+            self.cache.bump(*laptop_tags(laptop_names))
+
+    def _record(self, event_type, **fields):
+        if self.events is not None:
+            self.events.record(event_type, **fields)
+
+    def _assignment(self, employee_id, name, role, laptop_name, date, unit_id=None):
+        return {
+            'employee_id': employee_id,
+            'name': name,
+            'role': role,
+            'laptop_assigned': laptop_name,
+            'status': 'Onboarding',
+            'date': date,
+            # The claimed unit, so offboarding can release it by _id
+            'unit_id': unit_id
+        }
+
+    def _unit_claim(self, employee_id, laptop_name, date, batch_id=None):
+        # Filter and update that take one free unit of the model out of inventory for the employee;
+        # a batch id lets a bulk claim find out afterwards which units it actually got
+        assigned = {'employee_id': employee_id, 'date': date}
+        if batch_id is not None:
+            assigned['batch'] = batch_id
+        return (
+            {'Laptop Name': laptop_name, 'Reserved.reserved_by': None, 'Assigned': None},
+            {'$set': {'Assigned': assigned}}
+        )
+
+    def _unit_release(self, record):
+        # Filter and update that put the unit of an assignment record back in stock; records written before
+        # unit ids were stored fall back to the model name
+        query = {'Assigned.employee_id': record['employee_id']}
+        if record.get('unit_id') is not None:
+            query['_id'] = record['unit_id']
+        else:
+            query['Laptop Name'] = record['laptop_assigned']
+        return query, {'$set': {'Assigned': None}}
+
+    def _active_assignment(self, employee_id, laptop_name):
+        return {'employee_id': employee_id, 'laptop_assigned': laptop_name, 'status': 'Onboarding'}
+
+    def _archive_update(self, return_date, batch_id=None):
+        # Archive the record in place: it stops matching the active filter in the same write that closes it
+        fields = {'status': 'Archived', 'return_date': return_date}
+        if batch_id is not None:
+            fields['offboarding_batch'] = batch_id
+        return {'$set': fields}
+
+    def _reactivate_update(self):
+        # Undo _archive_update when the unit could not be released and there is no transaction to abort
+        return {'$set': {'status': 'Onboarding'}, '$unset': {'return_date': '', 'offboarding_batch': ''}}
+
+    def assign_laptop(self, employee_id, name, role, laptop_name):
+        # Claim a free unit, then record the assignment; returns (message, error)
+        if not employee_id:
+            return None, 'Employee ID is required.'
+        date = datetime.datetime.now().strftime('%Y-%m-%d')
+
+        def work(session):
+            unit = self.laptops.find_one_and_update(*self._unit_claim(employee_id, laptop_name, date),
+                                                    return_document=ReturnDocument.AFTER, session=session)
+            if unit is None:
+                return None
+            try:
+                self.collection.insert_one(self._assignment(employee_id, name, role, laptop_name, date, unit['_id']),
+                                           session=session)
+            except PyMongoError:
+                # Inside a transaction the abort releases the unit; without one we have to
+                if session is None:
+                    self.laptops.update_one({'_id': unit['_id']}, {'$set': {'Assigned': None}})
+                raise
+            return unit
+
+        unit = self._run(work)
+        if unit is None:
+            return None, f"Laptop '{laptop_name}' is not available."
+        self._write_through([unit], [laptop_name])
+        self._record(LAPTOP_ASSIGNED, employee_id=employee_id, name=name, role=role, laptop_name=laptop_name)
+        return f"Laptop '{laptop_name}' assigned to employee '{employee_id}'.", None
+
+    def assign_laptops(self, assignments):
+        # Claim units for many (employee_id, name, role, laptop_name) assignments with one bulk write,
+        # then record the ones that got a unit with one unordered bulk insert
+        if not assignments:
+            return []
+        if not all(employee_id for employee_id, _, _, _ in assignments):
+            raise ValueError('Every assignment needs an employee ID.')
+        date = datetime.datetime.now().strftime('%Y-%m-%d')
+        batch_id = str(uuid.uuid4())
+
+        self.laptops.bulk_write([
+            UpdateOne(*self._unit_claim(employee_id, laptop_name, date, batch_id))
+            for employee_id, name, role, laptop_name in assignments
+        ], ordered=False)
+
+        # A claim that matched no free unit is not an error to MongoDB, so look at what each employee got
+        claimed = {}
+        for unit in self.laptops.find({'Assigned.batch': batch_id}):
+            claimed.setdefault((unit['Assigned']['employee_id'], unit['Laptop Name']), []).append(unit)
+        failed = {}
+        units = {}
+        for index, (employee_id, name, role, laptop_name) in enumerate(assignments):
+            if claimed.get((employee_id, laptop_name)):
+                units[index] = claimed[(employee_id, laptop_name)].pop()
+            else:
+                failed[index] = f"Laptop '{laptop_name}' is not available."
+
+        # Collect per-document failures instead of aborting the whole batch
+        placed = list(units)
+        if placed:
+            try:
+                self.collection.insert_many(
+                    [self._assignment(*assignments[index], date, units[index]['_id']) for index in placed], ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get('writeErrors', []):
+                    index = placed[error['index']]
+                    failed[index] = error.get('errmsg', 'Failed to record assignment.')
+                released = [units.pop(index)['_id'] for index in placed if index in failed]
+                self.laptops.update_many({'_id': {'$in': released}}, {'$set': {'Assigned': None}})
+        if units:
+            self._write_through(units.values(), [laptop_name for _, _, _, laptop_name in assignments])
+
+        results = []
+        for index, (employee_id, name, role, laptop_name) in enumerate(assignments):
+            if index in failed:
+                results.append((None, failed[index]))
+            else:
+                self._record(LAPTOP_ASSIGNED, employee_id=employee_id, name=name, role=role, laptop_name=laptop_name)
+                results.append((f"Laptop '{laptop_name}' assigned to employee '{employee_id}'.", None))
+        return results
+
+    def return_laptop(self, employee_id, laptop_name):
+        # Archive the assignment and put the laptop back in inventory: two writes, and no reads besides
+        return_date = datetime.datetime.now().strftime('%Y-%m-%d')
+
+        def work(session):
+            # Only one concurrent offboard can archive the active record
+            record = self.collection.find_one_and_update(
+                self._active_assignment(employee_id, laptop_name), self._archive_update(return_date), session=session)
+            if record is None:
+                return None
+            try:
+                unit = self.laptops.find_one_and_update(*self._unit_release(record),
+                                                        return_document=ReturnDocument.AFTER, session=session)
+            except PyMongoError:
+                # Without a transaction, make the record active again so the offboard can simply be retried
+                if session is None:
+                    self.collection.update_one({'_id': record['_id']}, self._reactivate_update())
+                raise
+            return [unit] if unit is not None else []
+
+        units = self._run(work)
+        if units is None:
+            return f"No active assignment found for laptop '{laptop_name}' with employee '{employee_id}'."
+        self._write_through(units, [laptop_name])
+        self._record(LAPTOP_RETURNED, employee_id=employee_id, laptop_name=laptop_name)
+        return f"Laptop '{laptop_name}' returned by employee '{employee_id}' and record archived."
+
+    def return_laptops(self, returns):
+        # Offboard many (employee_id, laptop_name) pairs, e.g. for a reorg, with a fixed number of round trips
+        return_date = datetime.datetime.now().strftime('%Y-%m-%d')
+        batch_id = str(uuid.uuid4())
+        pairs = list(set(returns))
+        if not pairs:
+            return []
+
+        def work(session):
+            # Archive every matching active record in one write; the batch id then finds exactly those
+            self.collection.update_many(
+                {'status': 'Onboarding',
+                 '$or': [{'employee_id': employee_id, 'laptop_assigned': laptop_name} for employee_id, laptop_name in pairs]},
+                self._archive_update(return_date, batch_id),
+                session=session
+            )
+            records = list(self.collection.find(
+                {'offboarding_batch': batch_id}, {'employee_id': 1, 'laptop_assigned': 1, 'unit_id': 1}, session=session))
+            if not records:
+                return [], []
+            try:
+                self.laptops.bulk_write([UpdateOne(*self._unit_release(record)) for record in records],
+                                        ordered=False, session=session)
+            except PyMongoError:
+                if session is None:
+                    self.collection.update_many({'offboarding_batch': batch_id}, self._reactivate_update())
+                raise
+            # Units of records that predate unit ids reach the index through the change stream or the next reload
+            unit_ids = [record['unit_id'] for record in records if record.get('unit_id') is not None]
+            units = list(self.laptops.find({'_id': {'$in': unit_ids}}, session=session)) if unit_ids else []
+            return records, units
+
+        records, units = self._run(work)
+        returned = {(record['employee_id'], record['laptop_assigned']) for record in records}
+        if returned:
+            self._write_through(units, list({laptop for _, laptop in returned}))
+
+        results = []
+        for employee_id, laptop_name in returns:
+            if (employee_id, laptop_name) in returned:
+                self._record(LAPTOP_RETURNED, employee_id=employee_id, laptop_name=laptop_name)
+                results.append(f"Laptop '{laptop_name}' returned by employee '{employee_id}' and record archived.")
+            else:
+                results.append(f"No active assignment found for laptop '{laptop_name}' with employee '{employee_id}'.")
+        return results
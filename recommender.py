@@ -0,0 +1,368 @@
+import json
+import threading
+
+import numpy as np
+from sklearn.metrics.pairwise import euclidean_distances
+
+from allocation import allocate, ranking_costs
+from cache import INVENTORY_TAG, MODEL_TAG
+from incremental import INCREMENTAL_TRAINING_SECONDS, fetch_history, update_artifact
+from maintenance import MAINTENANCE_SKIP_DUE
+from metrics import INCREMENTAL_TRAINING_FAILURES, RECOMMENDATIONS, stage
+from neighbors import NEIGHBOR_BACKEND
+from train import load_or_train, save_artifact
+
+
+class ModelState:
+    # One fitted model and the per-role recommendations derived from it. Nothing changes it after it is built:
+    # a new artifact gets a new state, published with a single assignment, so a request that reads
+    # Recommender.state once never mixes the table of one model with the vocabulary of another.
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.features = artifact['features']
+        self.poly = artifact['poly']
+        self.scaler = artifact['scaler']
+        self.knn = artifact['knn']
+        self.role_vocabulary = self.features.role_vocabulary
+        self.laptop_vocabulary = self.features.laptop_vocabulary
+        with stage('recommendation_table'):
+            self.recommendation_table = self._build_recommendation_table()
+
+    def _build_recommendation_table(self):
+        # The recommendation only depends on the role, so compute it once per role from the stored role means
+        role_codes, role_features = self.features.role_feature_matrix()
+
+        # Create polynomial features for every role at once
+        with stage('transform'):
+            input_features_poly = self.poly.transform(role_features)
+            input_features_scaled = self.scaler.transform(input_features_poly)
+
+        # Distance from each role to the closest training example of every laptop class
+        classes = self.knn.classes_
+        with stage('class_distances'):
+            X_train_scaled = self.scaler.transform(self.artifact['X_train_poly'])
+            y_train = self.artifact['y_train']
+            class_distances = np.empty((len(role_codes), len(classes)))
+            for column, code in enumerate(classes):
+                class_distances[:, column] = euclidean_distances(input_features_scaled, X_train_scaled[y_train == code]).min(axis=1)
+
+        # Rank every laptop class: k-NN vote share first (ties by code, so the first entry is what
+        # knn.predict returns), then classes without votes by distance
+        with stage('knn'):
+            probabilities = self.knn.predict_proba(input_features_scaled)
+        voted_order = np.where(probabilities > 0, np.arange(len(classes)), len(classes))
+        ranking = np.lexsort((class_distances, voted_order, -probabilities), axis=-1)
+
+        recommendation_table = {}
+        for row, role_code in enumerate(role_codes):
+            ranked_laptops = classes[ranking[row]]
+            recommendation_table[self.role_vocabulary.name(role_code)] = {
+                'role_code': role_code,
+                'features': input_features_scaled[row],
+                'ranked_laptops': ranked_laptops,
+                'distances': class_distances[row, ranking[row]],
+                'laptop_names': [self.laptop_vocabulary.name(code) for code in ranked_laptops],
+                'requirements': role_features[row, 1:],
+            }
+
+        return recommendation_table
+
+
+class Recommender:
+    # The k-NN side of the service: the fitted model, the per-role ranking table and everything that reads them.
+    # service.py builds it on the first recommendation, so requests that never recommend never import scikit-learn.
+    def __init__(self, inventory, ticketing_system, predictive_maintenance, response_cache, history_collections,
+                 neighbor_backend=None):
+        self.inventory = inventory
+        self.ticketing_system = ticketing_system
+        self.predictive_maintenance = predictive_maintenance
+        self.response_cache = response_cache
+        self.history_collections = history_collections
+
+        # Load the fitted model, retraining only when the training data has changed
+        self.update_lock = threading.Lock()
+        self.trainer = None
+        self.stop_event = threading.Event()
+        self.inventory_masks = None
+        self.inventory.add_listener(self._inventory_changed)
+        self.apply_artifact(load_or_train(neighbor_backend=neighbor_backend or NEIGHBOR_BACKEND))
+        self.start_incremental_training()
+
+    def apply_artifact(self, artifact):
+        # Precompute the per-role recommendations before the new model becomes visible
+        self.state = ModelState(artifact)
+        self.response_cache.bump(MODEL_TAG)
+
+    def update_from_history(self, limit=None):
+        # Fold new onboarding records into the model and swap it in without a full refit
+        with self.update_lock:
+            current = self.state.artifact
+            rows, watermark = fetch_history(self.history_collections, self.inventory, current['history_watermark'], limit)
+            if watermark == current['history_watermark']:
+                return 0
+            if rows:
+                artifact = update_artifact(current, rows, watermark)
+            else:
+                artifact = dict(current, history_watermark=watermark)
+            self.apply_artifact(artifact)
+            try:
+                save_artifact(artifact)
+            except OSError:
+                pass
+            return len(rows)
+
+    def start_incremental_training(self, interval=INCREMENTAL_TRAINING_SECONDS):
+        # Periodically pull new onboarding records into the running model
+        if self.trainer is not None or interval <= 0:
+            return
+        self.stop_event.clear()
+        self.trainer = threading.Thread(target=self._training_loop, args=(interval,), name='incremental-training', daemon=True)
+        self.trainer.start()
+
+    def stop_incremental_training(self):
+        self.stop_event.set()
+        self.trainer = None
+
+    def _training_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            try:
+                self.update_from_history()
+            except Exception:
+                # Keep serving the current model and retry on the next tick; the failure shows up on /metrics
+                INCREMENTAL_TRAINING_FAILURES.inc()
+
+    def get_inventory_masks(self, vocabulary):
+        # Per laptop code of the vocabulary: free (unreserved, unassigned) units, has a GPU, its specs, and not
+        # due for service
+        masks = self.inventory_masks
+        fleet = self.predictive_maintenance.get_fleet()
+        if (masks is not None and masks['version'] == self.inventory.version
+                and masks['vocabulary'] is vocabulary and masks['fleet'] is fleet):
+            return masks
+
+        version = self.inventory.version
+        size = len(vocabulary)
+        masks = {'version': version, 'vocabulary': vocabulary, 'fleet': fleet,
+                 'available': np.zeros(size, dtype=bool), 'free': np.zeros(size, dtype=np.int64),
+                 'gpu': np.zeros(size, dtype=bool), 'cpu': np.zeros(size), 'ram': np.zeros(size),
+                 'storage': np.zeros(size), 'serviceable': np.ones(size, dtype=bool)}
+        for code, laptop_name in enumerate(vocabulary):
+            masks['serviceable'][code] = fleet['serviceable'].get(laptop_name, True)
+            self._fill_masks(masks, code, laptop_name)
+        self.inventory_masks = masks
+        return masks
+
+    def _fill_masks(self, masks, code, laptop_name):
+        entry = self.inventory.get(laptop_name)
+        if entry is None:
+            masks['free'][code] = 0
+            masks['available'][code] = False
+            return
+        masks['free'][code] = entry['free']
+        masks['available'][code] = entry['free'] > 0
+        masks['gpu'][code] = entry['gpu']
+        masks['cpu'][code] = entry['cpu'] or 0
+        masks['ram'][code] = entry['ram'] or 0
+        masks['storage'][code] = entry['storage'] or 0
+
+    def _inventory_changed(self, version, laptop_names):
+        # Called by the inventory index under its lock: patch the changed models' entries instead of letting
+        # the next recommendation rebuild the masks for the whole fleet. Masks that were already behind are
+        # left to that rebuild
+        masks = self.inventory_masks
+        if masks is None or masks['version'] != version - 1:
+            return
+        for laptop_name in laptop_names:
+            code = masks['vocabulary'].code(laptop_name)
+            if code is not None:
+                self._fill_masks(masks, code, laptop_name)
+        masks['version'] = version
+
+    def recommend_top_laptops(self, role, require_gpu=None, top_k=3, min_cpu=None, min_ram=None, min_storage=None,
+                              skip_maintenance=MAINTENANCE_SKIP_DUE):
+        # Every argument is part of the key; like recommend_laptop, only successful answers are cached
+        with stage('recommend'):
+            laptops, status = self.response_cache.get_or_compute(
+                json.dumps(['recommend_top', role, require_gpu, top_k, min_cpu, min_ram, min_storage, skip_maintenance]),
+                [INVENTORY_TAG, MODEL_TAG],
+                lambda: self._recommend_top_laptops(role, require_gpu, top_k, min_cpu, min_ram, min_storage, skip_maintenance),
+                cacheable=lambda result: bool(result[0])
+            )
+        return laptops, status
+
+    def _recommend_top_laptops(self, role, require_gpu=None, top_k=3, min_cpu=None, min_ram=None, min_storage=None,
+                               skip_maintenance=MAINTENANCE_SKIP_DUE):
+        # Look up the precomputed ranking for the role
+        state = self.state
+        entry = state.recommendation_table.get(role)
+        if entry is None:
+            RECOMMENDATIONS.inc(outcome='unknown_role')
+            with stage('ticket'):
+                ticket_id = self.ticketing_system.create_ticket(f"Role '{role}' not found in dataset.")
+            return [], f"Role not found in dataset. Ticket ID: {ticket_id}"
+
+        # Filter the whole ranking against the inventory in one vectorized pass
+        with stage('inventory_masks'):
+            masks = self.get_inventory_masks(state.laptop_vocabulary)
+        codes = entry['ranked_laptops']
+        keep = masks['available'][codes]
+        if require_gpu:
+            keep &= masks['gpu'][codes]
+        if min_cpu is not None:
+            keep &= masks['cpu'][codes] >= min_cpu
+        if min_ram is not None:
+            keep &= masks['ram'][codes] >= min_ram
+        if min_storage is not None:
+            keep &= masks['storage'][codes] >= min_storage
+        if skip_maintenance:
+            # Skip models whose machines are all overdue, due soon or flagged for service
+            keep &= masks['serviceable'][codes]
+
+        laptops = [entry['laptop_names'][index] for index in np.flatnonzero(keep)[:top_k]]
+        if not laptops:
+            RECOMMENDATIONS.inc(outcome='unavailable')
+            requirement = ' with a GPU' if require_gpu else ''
+            with stage('ticket'):
+                ticket_id = self.ticketing_system.create_ticket(f"No available laptop{requirement} for role '{role}'.")
+            return [], f"Laptop not available. Ticket ID: {ticket_id}"
+
+        RECOMMENDATIONS.inc(outcome='success')
+        return laptops, 'Recommendation successful.'
+
+    def recommend_laptop(self, role, require_gpu=None):
+        # Best available laptop for the role, falling back down the ranking when it is out of stock
+        # Only successful answers are cached so failures keep raising tickets
+        with stage('recommend'):
+            laptop, status = self.response_cache.get_or_compute(
+                json.dumps(['recommend', role, require_gpu]),
+                [INVENTORY_TAG, MODEL_TAG],
+                lambda: self._recommend_laptop(role, require_gpu),
+                cacheable=lambda result: result[0] is not None
+            )
+        return laptop, status
+
+    def _recommend_laptop(self, role, require_gpu=None):
+        laptops, status = self._recommend_top_laptops(role, require_gpu, top_k=1)
+        if not laptops:
+            return None, status
+        return laptops[0], status
+
+    def recommend_laptops(self, requests):
+        # Recommend laptops for a list of (role, require_gpu) pairs, resolving each distinct pair once
+        recommendations = {}
+        results = []
+        for role, require_gpu in requests:
+            key = (role, require_gpu)
+            if key not in recommendations:
+                recommendations[key] = self.recommend_laptop(role, require_gpu)
+            results.append(recommendations[key])
+        return results
+
+    def plan_batch(self, employees, skip_maintenance=MAINTENANCE_SKIP_DUE):
+        # Each employee's best pick in the order given, like recommend_laptops, except that no model is handed
+        # out more often than it has free units; once they run out the rest of the group moves down the ranking.
+        # Returns (assignments, positions, results) like plan_cohort
+        results = [None] * len(employees)
+        state = self.state
+        with stage('inventory_masks'):
+            masks = self.get_inventory_masks(state.laptop_vocabulary)
+        remaining = masks['free'].copy()
+        candidates = {}
+        errors = {}
+        assignments = []
+        positions = []
+        for index, employee in enumerate(employees):
+            role = employee.get('role')
+            require_gpu = bool(employee.get('require_gpu'))
+            key = (role, require_gpu)
+            if key not in candidates and key not in errors:
+                entry = state.recommendation_table.get(role)
+                if entry is None:
+                    RECOMMENDATIONS.inc(outcome='unknown_role')
+                    with stage('ticket'):
+                        ticket_id = self.ticketing_system.create_ticket(f"Role '{role}' not found in dataset.")
+                    errors[key] = f"Role not found in dataset. Ticket ID: {ticket_id}"
+                else:
+                    codes = entry['ranked_laptops']
+                    keep = masks['available'][codes]
+                    if require_gpu:
+                        keep &= masks['gpu'][codes]
+                    if skip_maintenance:
+                        keep &= masks['serviceable'][codes]
+                    # The group's usable models best first, and how far down them it has got
+                    candidates[key] = [codes[keep].tolist(), 0]
+            if key in errors:
+                results[index] = {'employee_id': employee.get('employee_id'), 'error': errors[key]}
+                continue
+
+            codes, position = candidates[key]
+            while position < len(codes) and not remaining[codes[position]]:
+                position += 1
+            candidates[key][1] = position
+            if position == len(codes):
+                RECOMMENDATIONS.inc(outcome='unavailable')
+                requirement = ' with a GPU' if require_gpu else ''
+                with stage('ticket'):
+                    ticket_id = self.ticketing_system.create_ticket(f"No available laptop{requirement} for role '{role}'.")
+                errors[key] = f"Laptop not available. Ticket ID: {ticket_id}"
+                results[index] = {'employee_id': employee.get('employee_id'), 'error': errors[key]}
+                continue
+            remaining[codes[position]] -= 1
+            assignments.append((employee.get('employee_id'), employee.get('name'), role, state.laptop_vocabulary.name(codes[position])))
+            positions.append(index)
+        RECOMMENDATIONS.inc(len(assignments), outcome='success')
+        return assignments, positions, results
+
+    def plan_cohort(self, employees, skip_maintenance=MAINTENANCE_SKIP_DUE):
+        # Solve one min-cost assignment of the whole cohort over the free stock instead of taking each
+        # employee's top pick in turn, so early hires cannot drain what later ones need.
+        # Returns (assignments, positions, results): the (employee_id, name, role, laptop) rows to commit,
+        # their indexes in employees, and the per-employee errors already known
+        results = [None] * len(employees)
+        state = self.state
+        groups = {}
+        for index, employee in enumerate(employees):
+            role = employee.get('role')
+            if role not in state.recommendation_table:
+                RECOMMENDATIONS.inc(outcome='unknown_role')
+                with stage('ticket'):
+                    ticket_id = self.ticketing_system.create_ticket(f"Role '{role}' not found in dataset.")
+                results[index] = {'employee_id': employee.get('employee_id'), 'error': f"Role not found in dataset. Ticket ID: {ticket_id}"}
+                continue
+            groups.setdefault((role, bool(employee.get('require_gpu'))), []).append(index)
+
+        # Employees with the same role and GPU need are interchangeable, so the solver works on groups
+        with stage('inventory_masks'):
+            masks = self.get_inventory_masks(state.laptop_vocabulary)
+        size = len(state.laptop_vocabulary)
+        keys = list(groups)
+        costs = np.empty((len(keys), size))
+        for row, (role, require_gpu) in enumerate(keys):
+            entry = state.recommendation_table[role]
+            costs[row] = ranking_costs(entry['ranked_laptops'], entry['distances'], size)
+            if require_gpu:
+                costs[row, ~masks['gpu']] = np.inf
+            if skip_maintenance:
+                costs[row, ~masks['serviceable']] = np.inf
+        with stage('allocate'):
+            allocation = allocate([len(groups[key]) for key in keys], costs, masks['free'])
+
+        # Hand out each group's laptops cheapest first, in the order the employees were given
+        assignments = []
+        positions = []
+        for row, (role, require_gpu) in enumerate(keys):
+            codes = [code for code in np.argsort(costs[row], kind='stable') for _ in range(allocation[row, code])]
+            members = groups[(role, require_gpu)]
+            for index, code in zip(members, codes):
+                employee = employees[index]
+                assignments.append((employee.get('employee_id'), employee.get('name'), role, state.laptop_vocabulary.name(code)))
+                positions.append(index)
+            if len(codes) < len(members):
+                RECOMMENDATIONS.inc(len(members) - len(codes), outcome='unavailable')
+                requirement = ' with a GPU' if require_gpu else ''
+                with stage('ticket'):
+                    ticket_id = self.ticketing_system.create_ticket(f"No available laptop{requirement} for role '{role}'.")
+                for index in members[len(codes):]:
+                    results[index] = {'employee_id': employees[index].get('employee_id'), 'error': f"Laptop not available. Ticket ID: {ticket_id}"}
+        RECOMMENDATIONS.inc(len(assignments), outcome='success')
+        return assignments, positions, results
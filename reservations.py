@@ -0,0 +1,216 @@
+import datetime
+import os
+import threading
+import uuid
+
+from pymongo import ASCENDING, ReturnDocument
+
+from cache import laptop_tags
+from db import get_database
+from events import RESERVATION_CREATED, RESERVATION_EXPIRED
+
+# Default hold length for reservations (0 keeps reservations until released)
+RESERVATION_HOLD_MINUTES = float(os.environ.get('RESERVATION_HOLD_MINUTES', 0))
+# How often the background sweeper releases expired holds
+RESERVATION_SWEEP_SECONDS = float(os.environ.get('RESERVATION_SWEEP_SECONDS', 60))
+# How many times a multi-laptop reservation retries after losing units to other managers
+RESERVATION_MAX_RETRIES = int(os.environ.get('RESERVATION_MAX_RETRIES', 3))
+
+
+class ReservationSystem:
+    def __init__(self, inventory=None, cache=None, events=None):
+        # Use the shared MongoDB connection pool
+        self.db = get_database()
+        self.collection = self.db['available_laptops']
+        self.inventory = inventory
+        self.cache = cache
+        self.events = events
+
+        # Contention metrics
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'reservations': 0,
+            'rejections': 0,
+            'conflicts': 0,
+            'retries': 0,
+            'expired': 0,
+        }
+
+        self.sweeper = None
+        self.stop_event = threading.Event()
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        # Every reservation query filters on the laptop name and the reservation fields
+        self.collection.create_index([('Laptop Name', ASCENDING)])
+        self.collection.create_index([('Laptop Name', ASCENDING), ('Reserved.reserved_by', ASCENDING)])
+        self.collection.create_index([('Reserved.expires_at', ASCENDING)], sparse=True)
+        self.collection.create_index([('Reserved.reservation_id', ASCENDING)], sparse=True)
+
+    def _count(self, name, amount=1):
+        with self.stats_lock:
+            self.stats[name] += amount
+
+    def get_stats(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def _free_filter(self, laptop_name, now):
+        # A unit is free if it is not assigned to an employee and nobody holds it or the hold has expired
+        return {
+            'Laptop Name': laptop_name,
+            'Assigned': None,
+            '$or': [
+                {'Reserved.reserved_by': None},
+                {'Reserved.expires_at': {'$lte': now}},
+            ],
+        }
+
+    def _reservation_update(self, manager_name, now, hold_minutes, reservation_id):
+        if hold_minutes is None:
+            hold_minutes = RESERVATION_HOLD_MINUTES
+        expires_at = now + datetime.timedelta(minutes=hold_minutes) if hold_minutes else None
+        return {'$set': {
+            'Reserved.reserved_by': manager_name,
+            'Reserved.reservation_date': now,
+            'Reserved.expires_at': expires_at,
+            'Reserved.reservation_id': reservation_id,
+        }}
+
+    def _write_through(self, documents):
+        # Keep the inventory index and cached responses in step with the reservations we just made
+        documents = list(documents)
+        if self.inventory is not None:
+            for document in documents:
+                self.inventory.apply_document(document)
+        if self.cache is not None and documents:
+            self.cache.bump(*laptop_tags(document['Laptop Name'] for document in documents))
+
+    def _record(self, event_type, **fields):
+        if self.events is not None:
+            self.events.record(event_type, **fields)
+
+    def _record_reservation(self, documents):
+        # One event per reservation, listing the units it holds
+        if not documents:
+            return
+        reserved = documents[0]['Reserved']
+        self._record(RESERVATION_CREATED, reservation_id=reserved['reservation_id'], laptop_name=documents[0]['Laptop Name'],
+                     manager_name=reserved['reserved_by'], unit_ids=[document['_id'] for document in documents],
+                     expires_at=reserved['expires_at'])
+
+    def reserve_laptop(self, laptop_name, manager_name, hold_minutes=None):
+        # Reserve a laptop for a manager
+        now = datetime.datetime.now()
+        laptop = self.collection.find_one_and_update(
+            self._free_filter(laptop_name, now),
+            self._reservation_update(manager_name, now, hold_minutes, str(uuid.uuid4())),
+            return_document=ReturnDocument.AFTER
+        )
+        if laptop:
+            self._count('reservations')
+            self._write_through([laptop])
+            self._record_reservation([laptop])
+            return f"Laptop '{laptop_name}' reserved by '{manager_name}'."
+        else:
+            self._count('rejections')
+            return f"Laptop '{laptop_name}' is not available for reservation or already reserved."
+
+    def reserve_laptops(self, laptop_name, manager_name, quantity, hold_minutes=None):
+        # Reserve several units of one model at once; either all of them are reserved or none
+        # (bool is an int subclass, and .limit(0) would mean "no limit")
+        if type(quantity) is not int or quantity < 1:
+            raise ValueError(f"Quantity must be a positive integer, got {quantity!r}.")
+        now = datetime.datetime.now()
+        reservation_id = str(uuid.uuid4())
+        update = self._reservation_update(manager_name, now, hold_minutes, reservation_id)
+        reserved = 0
+
+        for attempt in range(RESERVATION_MAX_RETRIES + 1):
+            if attempt:
+                self._count('retries')
+            needed = quantity - reserved
+            candidates = [doc['_id'] for doc in self.collection.find(self._free_filter(laptop_name, now), {'_id': 1}).limit(needed)]
+            if len(candidates) < needed:
+                break
+
+            # Only units that are still free when the update runs are taken
+            free_filter = self._free_filter(laptop_name, now)
+            free_filter['_id'] = {'$in': candidates}
+            result = self.collection.update_many(free_filter, update)
+            reserved += result.modified_count
+            if result.modified_count < needed:
+                self._count('conflicts', needed - result.modified_count)
+            if reserved >= quantity:
+                break
+
+        if reserved < quantity:
+            # Give back the units we did get
+            if reserved:
+                self.collection.update_many(
+                    {'Reserved.reservation_id': reservation_id},
+                    {'$set': {'Reserved.reserved_by': None, 'Reserved.reservation_date': None,
+                              'Reserved.expires_at': None, 'Reserved.reservation_id': None}}
+                )
+            self._count('rejections')
+            return f"Not enough '{laptop_name}' laptops available to reserve {quantity}; no laptops were reserved."
+
+        self._count('reservations', quantity)
+        documents = list(self.collection.find({'Reserved.reservation_id': reservation_id}))
+        self._write_through(documents)
+        self._record_reservation(documents)
+        return f"{quantity} '{laptop_name}' laptops reserved by '{manager_name}'."
+
+    def check_reservation(self, laptop_name):
+        # Check the reservation status of a laptop
+        laptop = self.collection.find_one({'Laptop Name': laptop_name})
+        if laptop:
+            reserved = laptop.get('Reserved') or {}
+            reserved_by = reserved.get('reserved_by')
+            expires_at = reserved.get('expires_at')
+            if reserved_by and (expires_at is None or expires_at > datetime.datetime.now()):
+                return f"Laptop '{laptop_name}' is reserved by '{reserved_by}'."
+            else:
+                return f"Laptop '{laptop_name}' is not reserved."
+        else:
+            return f"Laptop '{laptop_name}' not found."
+
+    def sweep_expired(self):
+        # Release every hold whose expiry has passed
+        now = datetime.datetime.now()
+        holds = list(self.collection.find({'Reserved.expires_at': {'$lte': now}},
+                                          {'_id': 1, 'Laptop Name': 1, 'Reserved': 1}))
+        if not holds:
+            return 0
+        expired = [doc['_id'] for doc in holds]
+        result = self.collection.update_many(
+            {'_id': {'$in': expired}, 'Reserved.expires_at': {'$lte': now}},
+            {'$set': {'Reserved.reserved_by': None, 'Reserved.reservation_date': None,
+                      'Reserved.expires_at': None, 'Reserved.reservation_id': None}}
+        )
+        self._count('expired', result.modified_count)
+        self._write_through(self.collection.find({'_id': {'$in': expired}}))
+        for doc in holds:
+            self._record(RESERVATION_EXPIRED, unit_id=doc['_id'], laptop_name=doc['Laptop Name'],
+                         manager_name=doc['Reserved'].get('reserved_by'), reservation_id=doc['Reserved'].get('reservation_id'))
+        return result.modified_count
+
+    def start_sweeper(self, interval=RESERVATION_SWEEP_SECONDS):
+        # Sweep expired holds in the background
+        if self.sweeper is not None or interval <= 0:
+            return
+        self.stop_event.clear()
+        self.sweeper = threading.Thread(target=self._sweep_loop, args=(interval,), name='reservation-sweeper', daemon=True)
+        self.sweeper.start()
+
+    def stop_sweeper(self):
+        self.stop_event.set()
+        self.sweeper = None
+
+    def _sweep_loop(self, interval):
+        while not self.stop_event.wait(interval):
+            try:
+                self.sweep_expired()
+            except Exception:
+                # A failed sweep is retried on the next tick
+                pass
@@ -0,0 +1,242 @@
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+import train
+
+# Pre-forking launcher for api.py: the model is loaded once here and shared copy-on-write with the workers
+#     python serve.py --workers 4 --port 5000 --server gunicorn
+#     kill -HUP <parent pid>    # load the current artifact/CSV and replace the workers one generation at a time
+# 'gunicorn' (optional dependency) runs the workers under gunicorn's arbiter and gthread workers and is the one to
+# use in production; 'werkzeug' is the built-in Launcher below, serving each worker with werkzeug's development server
+SERVE_SERVER = os.environ.get('SERVE_SERVER', 'werkzeug')
+SERVE_SERVERS = ('werkzeug', 'gunicorn')
+SERVE_HOST = os.environ.get('SERVE_HOST', '0.0.0.0')
+SERVE_PORT = int(os.environ.get('SERVE_PORT', 5000))
+SERVE_WORKERS = int(os.environ.get('SERVE_WORKERS', os.cpu_count() or 1))
+# How long a worker may spend finishing in-flight requests after it is told to stop
+SERVE_GRACEFUL_SECONDS = float(os.environ.get('SERVE_GRACEFUL_SECONDS', 30))
+# Request threads per gunicorn worker
+SERVE_THREADS = int(os.environ.get('SERVE_THREADS', 8))
+
+
+def load_model():
+    # Train or load in the parent only; workers find it through train.load_or_train
+    # Let the previous model be collected once the workers still using it are gone
+    gc.unfreeze()
+    train.preload(None)
+    artifact = train.load_or_train()
+    train.preload(artifact)
+    # Keep the collector from touching (and so copying) the shared objects in every worker
+    gc.collect()
+    gc.freeze()
+    return artifact
+
+
+def share_response_cache(workers):
+    # A per-process memory cache would keep serving a /check answer that another worker's write made stale,
+    # so unless told otherwise the workers share one SQLite cache (read when api is imported after the fork)
+    if workers > 1:
+        os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'sqlite')
+
+
+def run_worker(listener):
+    # Runs in the forked child: build the app around the shared artifact and serve on the inherited socket
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    import api
+    # The artifact is already in memory, so this only builds the ranking table before the first request
+    api.model.load('recommender', 'reservation_system')
+    server = make_server(SERVE_HOST, SERVE_PORT, api.app, threaded=True, fd=listener.fileno())
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever, so it must run off the main thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    server.serve_forever()
+    server.server_close()
+    # os._exit skips atexit, so flush the event log here
+    api.model.close()
+
+
+class Launcher:
+    def __init__(self, host, port, workers):
+        self.workers = workers
+        share_response_cache(workers)
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(128)
+        self.listener.set_inheritable(True)
+        self.children = {}
+        self.generation = 0
+        self.reload_requested = False
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.listener)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = self.generation
+        return pid
+
+    def stop_workers(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + SERVE_GRACEFUL_SECONDS
+        for pid in pids:
+            while time.monotonic() < deadline:
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if done:
+                    break
+                time.sleep(0.05)
+            else:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                except (ProcessLookupError, ChildProcessError):
+                    pass
+            self.children.pop(pid, None)
+
+    def reload(self):
+        # Bring up a full generation on the new model before retiring the old one, so the socket is always served
+        try:
+            artifact = load_model()
+        except Exception as e:
+            print(f"Reload failed, keeping the current model: {e}", file=sys.stderr)
+            return
+        old = list(self.children)
+        self.generation += 1
+        for _ in range(self.workers):
+            self.spawn()
+        self.stop_workers(old)
+        print(f"Reloaded model (checksum {artifact['checksum'][:12]}) into generation {self.generation}.", flush=True)
+
+    def run(self):
+        artifact = load_model()
+        print(f"Serving model (checksum {artifact['checksum'][:12]}) with {self.workers} workers.", flush=True)
+        signal.signal(signal.SIGHUP, self.request_reload)
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid and pid in self.children:
+                # Replace workers that died on their own; retired ones were already removed
+                generation = self.children.pop(pid)
+                if generation == self.generation:
+                    print(f"Worker {pid} exited with status {status}; starting a replacement.", file=sys.stderr)
+                    self.spawn()
+            elif not pid:
+                time.sleep(0.2)
+
+        self.stop_workers(list(self.children))
+        self.listener.close()
+
+    def request_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+
+def run_gunicorn(host, port, workers):
+    # The same preload-then-fork under gunicorn: preload_app makes the master call load() (and so load_model) before
+    # it forks, post_fork builds each worker's subsystems, and on HUP on_reload loads the new artifact before gunicorn
+    # starts the next generation of workers and retires the old one
+    from gunicorn.app.base import BaseApplication
+
+    share_response_cache(workers)
+    current = {}
+
+    def application(environ, start_response):
+        # api is first imported in post_fork, so no MongoDB client is created before the fork
+        import api
+        return api.app(environ, start_response)
+
+    def post_fork(server, worker):
+        import api
+        api.model.load('recommender', 'reservation_system')
+
+    def worker_exit(server, worker):
+        api = sys.modules.get('api')
+        if api is not None:
+            api.model.close()
+
+    def on_reload(server):
+        try:
+            current['artifact'] = load_model()
+        except Exception as e:
+            # The new generation starts regardless, so hand it the model the current one is serving
+            train.preload(current.get('artifact'))
+            server.log.error(f"Reload failed, keeping the current model: {e}")
+            return
+        server.log.info(f"Reloaded model (checksum {current['artifact']['checksum'][:12]}).")
+
+    class Application(BaseApplication):
+        def load_config(self):
+            settings = {
+                'bind': f'{host}:{port}',
+                'workers': workers,
+                'worker_class': 'gthread',
+                'threads': SERVE_THREADS,
+                'graceful_timeout': int(SERVE_GRACEFUL_SECONDS),
+                'preload_app': True,
+                'post_fork': post_fork,
+                'worker_exit': worker_exit,
+                'on_reload': on_reload,
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            current['artifact'] = load_model()
+            print(f"Serving model (checksum {current['artifact']['checksum'][:12]}) with {workers} gunicorn workers.",
+                  flush=True)
+            return application
+
+    Application().run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve api.py from several worker processes sharing one loaded model.')
+    parser.add_argument('--host', default=SERVE_HOST)
+    parser.add_argument('--port', type=int, default=SERVE_PORT)
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS)
+    parser.add_argument('--server', choices=SERVE_SERVERS, default=SERVE_SERVER)
+    args = parser.parse_args()
+    SERVE_HOST, SERVE_PORT = args.host, args.port
+    if args.server == 'gunicorn':
+        run_gunicorn(args.host, args.port, args.workers)
+    else:
+        Launcher(args.host, args.port, args.workers).run()
@@ -0,0 +1,244 @@
+import json
+import threading
+
+from cache import ResponseCache, laptop_tag
+from db import get_database
+from metrics import registry, stage
+
+# The one implementation behind the CLI (Lap_Rec.py) and the web apps (api.py, async_api.py).
+# Subsystems are built on first use and their modules imported then, so a reservation check or a
+# ticket update never loads pandas or scikit-learn and never fits the model.
+
+# Per-item error for batch requests whose employees list holds something other than objects
+EMPLOYEE_NOT_AN_OBJECT = 'Each employee must be a JSON object.'
+
+
+class LaptopRecommendationModel:
+    def __init__(self, neighbor_backend=None):
+        # None lets the recommender use LAPTOP_NEIGHBOR_BACKEND
+        self.neighbor_backend = neighbor_backend
+        self.lock = threading.Lock()
+        self.build_locks = {}
+        self.subsystems = {}
+
+    def _subsystem(self, name, build):
+        # Build each subsystem once. Every name has its own lock, so a reservation check never waits while the
+        # recommender trains; builders ask for their dependencies, which always lie further down, so no cycle forms
+        subsystem = self.subsystems.get(name)
+        if subsystem is None:
+            with self.lock:
+                build_lock = self.build_locks.setdefault(name, threading.Lock())
+            with build_lock:
+                subsystem = self.subsystems.get(name)
+                if subsystem is None:
+                    subsystem = self.subsystems[name] = build()
+        return subsystem
+
+    def is_loaded(self, name):
+        return name in self.subsystems
+
+    def load(self, *names):
+        # Build the named subsystems now instead of on first use, e.g. before a worker starts serving
+        for name in names:
+            getattr(self, name)
+        return self
+
+    @property
+    def db(self):
+        # Use the shared MongoDB connection pool
+        return self._subsystem('db', get_database)
+
+    @property
+    def response_cache(self):
+        # Repeated reads are answered from the response cache until a write bumps their tags
+        def build():
+            cache = ResponseCache()
+            registry.register_gauges('laptop_response_cache', 'Response cache counters.', cache.get_stats, 'stat')
+            return cache
+        return self._subsystem('response_cache', build)
+
+    @property
+    def event_log(self):
+        # Every state change is appended here by a background writer, off the request path
+        def build():
+            from events import EventLog
+            event_log = EventLog()
+            registry.register_gauges('laptop_event_log', 'Event log writer counters.', event_log.get_stats, 'stat')
+            return event_log
+        return self._subsystem('event_log', build)
+
+    @property
+    def inventory(self):
+        # Index the available laptops by name
+        def build():
+            from inventory import InventoryIndex
+            inventory = InventoryIndex(self.db['available_laptops'], self.response_cache)
+            inventory.start_watching()
+            return inventory
+        return self._subsystem('inventory', build)
+
+    @property
+    def ticketing_system(self):
+        def build():
+            from tickets import TicketingSystem
+            return TicketingSystem(self.event_log)
+        return self._subsystem('ticketing_system', build)
+
+    @property
+    def predictive_maintenance(self):
+        def build():
+            from maintenance import PredictiveMaintenance
+            return PredictiveMaintenance(self.response_cache, self.event_log)
+        return self._subsystem('predictive_maintenance', build)
+
+    @property
+    def onboarding_offboarding(self):
+        def build():
+            from onboarding import OnboardingOffboarding
+            return OnboardingOffboarding(self.inventory, self.response_cache, self.event_log)
+        return self._subsystem('onboarding_offboarding', build)
+
+    @property
+    def reservation_system(self):
+        def build():
+            from reservations import ReservationSystem
+            reservation_system = ReservationSystem(self.inventory, self.response_cache, self.event_log)
+            reservation_system.start_sweeper()
+            registry.register_gauges('laptop_reservations', 'Reservation contention counters.',
+                                     reservation_system.get_stats, 'stat')
+            return reservation_system
+        return self._subsystem('reservation_system', build)
+
+    @property
+    def recommender(self):
+        # Loading the fitted model (or training it) is the expensive part, so it waits for the first recommendation
+        def build():
+            from recommender import Recommender
+            with stage('load_model'):
+                return Recommender(
+                    self.inventory, self.ticketing_system, self.predictive_maintenance, self.response_cache,
+                    [self.db['onboarding_offboarding_data'], self.db['offboarding_archive']], self.neighbor_backend
+                )
+        return self._subsystem('recommender', build)
+
+    def recommend_top_laptops(self, *args, **kwargs):
+        return self.recommender.recommend_top_laptops(*args, **kwargs)
+
+    def recommend_laptop(self, role, require_gpu=None):
+        return self.recommender.recommend_laptop(role, require_gpu)
+
+    def recommend_laptops(self, requests):
+        return self.recommender.recommend_laptops(requests)
+
+    def recommend_employees(self, employees):
+        # One result per employee of a batch request; items that are not objects get an error of their own
+        valid = [employee for employee in employees if isinstance(employee, dict)]
+        recommendations = iter(self.recommend_laptops([(e.get('role'), e.get('require_gpu', None)) for e in valid]))
+        results = []
+        for employee in employees:
+            if not isinstance(employee, dict):
+                results.append({'error': EMPLOYEE_NOT_AN_OBJECT})
+                continue
+            laptop, status = next(recommendations)
+            if laptop:
+                results.append({'laptop': laptop, 'status': status})
+            else:
+                results.append({'error': status})
+        return results
+
+    def update_from_history(self, limit=None):
+        return self.recommender.update_from_history(limit)
+
+    def onboard_employee(self, employee_id, name, role, require_gpu=None):
+        # Get laptop recommendation
+        laptop, status = self.recommend_laptop(role, require_gpu)
+
+        if laptop:
+            # Assign laptop to the employee
+            with stage('assign'):
+                assignment_message, error = self.onboarding_offboarding.assign_laptop(employee_id, name, role, laptop)
+            if error:
+                return error
+            return f"{assignment_message} Maintenance status: {status}"
+        else:
+            return status
+
+    def onboard_employees(self, employees):
+        # Give each employee their best pick in turn, capped at the free units of each model
+        return self._plan_and_assign(self.recommender.plan_batch, employees)
+
+    def allocate_cohort(self, employees, **kwargs):
+        # Plan the cohort with one min-cost assignment over the free stock, then commit the whole plan
+        return self._plan_and_assign(self.recommender.plan_cohort, employees, **kwargs)
+
+    def _plan_and_assign(self, plan, employees, **kwargs):
+        # Employees that cannot be assigned at all get their error up front; the rest are planned together
+        results = [None] * len(employees)
+        valid = []
+        for index, employee in enumerate(employees):
+            if not isinstance(employee, dict):
+                results[index] = {'employee_id': None, 'error': EMPLOYEE_NOT_AN_OBJECT}
+            elif not employee.get('employee_id'):
+                results[index] = {'employee_id': employee.get('employee_id'), 'error': 'Employee ID is required.'}
+            else:
+                valid.append(index)
+        assignments, positions, planned = plan([employees[index] for index in valid], **kwargs)
+        for position, result in enumerate(planned):
+            if result is not None:
+                results[valid[position]] = result
+        return self._assign_planned(assignments, [valid[position] for position in positions], results)
+
+    def _assign_planned(self, assignments, positions, results):
+        # Commit a plan with one bulk claim and one bulk insert; employees whose unit was taken meanwhile get an error
+        with stage('assign_batch'):
+            assigned = self.onboarding_offboarding.assign_laptops(assignments)
+        for index, (employee_id, name, role, laptop), (assignment_message, error) in zip(positions, assignments, assigned):
+            if error:
+                results[index] = {'employee_id': employee_id, 'error': error}
+            else:
+                results[index] = {'employee_id': employee_id, 'laptop': laptop, 'message': f"{assignment_message} Maintenance status: Recommendation successful."}
+        return results
+
+    def offboard_employee(self, employee_id, laptop_name):
+        with stage('offboard'):
+            return self.onboarding_offboarding.return_laptop(employee_id, laptop_name)
+
+    def offboard_employees(self, employees):
+        # Offboard a whole group, e.g. after a reorg, in a fixed number of round trips
+        valid = [employee for employee in employees if isinstance(employee, dict)]
+        with stage('offboard_batch'):
+            messages = iter(self.onboarding_offboarding.return_laptops([(e.get('employee_id'), e.get('laptop_name')) for e in valid]))
+        results = []
+        for employee in employees:
+            if isinstance(employee, dict):
+                results.append({'employee_id': employee.get('employee_id'), 'message': next(messages)})
+            else:
+                results.append({'employee_id': None, 'error': EMPLOYEE_NOT_AN_OBJECT})
+        return results
+
+    def reserve_laptop(self, laptop_name, manager_name, hold_minutes=None):
+        with stage('reserve'):
+            return self.reservation_system.reserve_laptop(laptop_name, manager_name, hold_minutes)
+
+    def reserve_laptops(self, laptop_name, manager_name, quantity, hold_minutes=None):
+        with stage('reserve'):
+            return self.reservation_system.reserve_laptops(laptop_name, manager_name, quantity, hold_minutes)
+
+    def check_reservation(self, laptop_name):
+        with stage('check_reservation'):
+            return self.response_cache.get_or_compute(
+                json.dumps(['check', laptop_name]),
+                [laptop_tag(laptop_name)],
+                lambda: self.reservation_system.check_reservation(laptop_name)
+            )
+
+    def close(self):
+        # Stop the background threads of whatever was built and write out the queued events
+        if self.is_loaded('reservation_system'):
+            self.reservation_system.stop_sweeper()
+        if self.is_loaded('recommender'):
+            self.recommender.stop_incremental_training()
+        if self.is_loaded('inventory'):
+            self.inventory.stop_watching()
+        if self.is_loaded('event_log'):
+            self.event_log.close()
@@ -0,0 +1,104 @@
+import datetime
+import uuid
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from db import get_database
+from events import TICKET_CREATED, TICKET_REPEATED, TICKET_UPDATED
+
+# Outcomes of update_ticket
+TICKET_UPDATE_OK = 'updated'
+TICKET_NOT_FOUND = 'not_found'
+TICKET_CONFLICT = 'conflict'
+
+
+class TicketingSystem:
+    def __init__(self, events=None):
+        # Tickets live in MongoDB so they survive restarts and are shared by every worker
+        self.db = get_database()
+        self.collection = self.db['tickets']
+        self.events = events
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        # Lookups by id, de-duplication of open issues and newest-first listing
+        self.collection.create_index([('ticket_id', ASCENDING)], unique=True)
+        self.collection.create_index(
+            [('description', ASCENDING)],
+            unique=True,
+            partialFilterExpression={'status': 'Open'},
+            name='open_description_unique'
+        )
+        self.collection.create_index([('status', ASCENDING), ('created_at', DESCENDING)])
+
+    def _record(self, event_type, **fields):
+        if self.events is not None:
+            self.events.record(event_type, **fields)
+
+    def _open_ticket(self, issue_description, now):
+        # Bump the open ticket for the issue, or open one if there is none
+        return self.collection.find_one_and_update(
+            {'description': issue_description, 'status': 'Open'},
+            {
+                '$inc': {'occurrences': 1},
+                '$set': {'last_seen': now},
+                '$setOnInsert': {'ticket_id': str(uuid.uuid4()), 'created_at': now},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def create_ticket(self, issue_description):
+        # Repeats of an issue that is still open bump the existing ticket instead of creating a new one
+        now = datetime.datetime.now()
+        for _ in range(2):
+            try:
+                ticket = self._open_ticket(issue_description, now)
+                break
+            except DuplicateKeyError:
+                # Another worker opened the same ticket first; the retry increments theirs
+                continue
+        else:
+            ticket = self.collection.find_one({'description': issue_description, 'status': 'Open'})
+            if ticket is not None:
+                # Its creator logged it, and this call did not bump it
+                return ticket['ticket_id']
+            # The contended ticket was closed in the meantime, so nothing is left to collide with
+            ticket = self._open_ticket(issue_description, now)
+        # The upsert counts from 1, so anything more is a repeat of an issue that already had its ticket
+        if ticket.get('occurrences') == 1:
+            self._record(TICKET_CREATED, ticket_id=ticket['ticket_id'], description=issue_description)
+        else:
+            self._record(TICKET_REPEATED, ticket_id=ticket['ticket_id'], occurrences=ticket.get('occurrences'))
+        return ticket['ticket_id']
+
+    def get_ticket(self, ticket_id):
+        return self.collection.find_one({'ticket_id': ticket_id}, {'_id': 0})
+
+    def get_tickets(self, page=1, page_size=50, status=None):
+        # Newest tickets first, one page at a time
+        query = {'status': status} if status else {}
+        page = max(int(page), 1)
+        page_size = max(int(page_size), 1)
+        cursor = self.collection.find(query, {'_id': 0}).sort('created_at', DESCENDING)
+        return list(cursor.skip((page - 1) * page_size).limit(page_size))
+
+    def count_tickets(self, status=None):
+        query = {'status': status} if status else {}
+        return self.collection.count_documents(query)
+
+    def update_ticket(self, ticket_id, status):
+        # Returns TICKET_UPDATE_OK, TICKET_NOT_FOUND or TICKET_CONFLICT
+        try:
+            result = self.collection.update_one(
+                {'ticket_id': ticket_id},
+                {'$set': {'status': status, 'updated_at': datetime.datetime.now()}}
+            )
+        except DuplicateKeyError:
+            # Reopening would duplicate an issue that already has an open ticket
+            return TICKET_CONFLICT
+        if not result.matched_count:
+            return TICKET_NOT_FOUND
+        self._record(TICKET_UPDATED, ticket_id=ticket_id, status=status)
+        return TICKET_UPDATE_OK
@@ -0,0 +1,159 @@
+import argparse
+import hashlib
+import os
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler, PolynomialFeatures
+
+from features import FeatureStore
+from neighbors import NEIGHBOR_BACKEND, NEIGHBOR_BACKENDS, make_neighbors
+
+# Bump whenever the contents of the artifact change shape
+ARTIFACT_VERSION = 4
+
+TRAINING_CSV = os.environ.get('LAPTOP_TRAINING_CSV', 'train_laptops.csv')
+ARTIFACT_PATH = os.environ.get('LAPTOP_MODEL_ARTIFACT', 'laptop_model.joblib')
+
+# Set by serve.py in the parent process so forked workers share one copy of the fitted model
+_preloaded = None
+
+FEATURE_COLUMNS = ['Role', 'Required CPU Speed (GHz)', 'Required RAM (GB)', 'Required Storage (GB)']
+
+
+def training_checksum(csv_path=TRAINING_CSV):
+    # SHA-256 of the training CSV, used to decide whether the artifact is stale
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_training_csv(csv_path=TRAINING_CSV):
+    # Load your dataset with roles and recommended laptops; '1,000' style numbers are parsed by the reader
+    return pd.read_csv(csv_path, thousands=',', dtype={
+        'Required CPU Speed (GHz)': float,
+        'Required RAM (GB)': int,
+        'Required Storage (GB)': int,
+    })
+
+
+def load_training_data(csv_path=TRAINING_CSV):
+    # pandas is only used to parse the CSV; the model works on the array-backed store
+    return FeatureStore.from_frame(read_training_csv(csv_path))
+
+
+def fit_model(features, neighbor_backend=NEIGHBOR_BACKEND):
+    # Features and target variable
+    X = features.feature_matrix()
+    y = features.laptops
+
+    # Create polynomial features
+    poly = PolynomialFeatures(degree=2)
+    X_poly = poly.fit_transform(X)
+
+    # Split the data into training and test sets
+    X_train, X_test, y_train, y_test = train_test_split(X_poly, y, test_size=0.2, random_state=42)
+
+    # Standardize features
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+
+    # Initialize and train k-NN model
+    knn = make_neighbors(neighbor_backend, n_neighbors=5)
+    knn.fit(X_train_scaled, y_train)
+
+    # The unscaled training rows are kept so the model can be updated incrementally
+    return poly, scaler, knn, X_train, np.asarray(y_train)
+
+
+def train_model(csv_path=TRAINING_CSV, neighbor_backend=NEIGHBOR_BACKEND):
+    features = load_training_data(csv_path)
+    poly, scaler, knn, X_train_poly, y_train = fit_model(features, neighbor_backend)
+
+    return {
+        'version': ARTIFACT_VERSION,
+        'checksum': training_checksum(csv_path),
+        'neighbor_backend': neighbor_backend,
+        'features': features,
+        'poly': poly,
+        'scaler': scaler,
+        'knn': knn,
+        'X_train_poly': X_train_poly,
+        'y_train': y_train,
+        # ObjectId of the last onboarding record folded into the model (see incremental.py)
+        'history_watermark': None,
+    }
+
+
+def save_artifact(artifact, artifact_path=ARTIFACT_PATH):
+    # Write to a temporary file first so readers never see a half-written artifact; each writer gets its own,
+    # so workers saving at the same time cannot interleave their bytes
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(artifact_path)}.", suffix='.tmp',
+                                    dir=os.path.dirname(os.path.abspath(artifact_path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            joblib.dump(artifact, f)
+        # mkstemp creates the file private to us; the artifact is meant to be read by any worker
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, artifact_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return artifact_path
+
+
+def load_artifact(artifact_path=ARTIFACT_PATH, checksum=None, neighbor_backend=None):
+    # Return None when the artifact is missing, from another version, trained on other data or with another backend
+    if not os.path.exists(artifact_path):
+        return None
+    try:
+        # Memory-map the fitted arrays instead of copying them into every process
+        artifact = joblib.load(artifact_path, mmap_mode='r')
+    except Exception:
+        return None
+    if not isinstance(artifact, dict) or artifact.get('version') != ARTIFACT_VERSION:
+        return None
+    if checksum is not None and artifact.get('checksum') != checksum:
+        return None
+    if neighbor_backend is not None and artifact.get('neighbor_backend') != neighbor_backend:
+        return None
+    return artifact
+
+
+def preload(artifact):
+    global _preloaded
+    _preloaded = artifact
+
+
+def load_or_train(csv_path=TRAINING_CSV, artifact_path=ARTIFACT_PATH, neighbor_backend=NEIGHBOR_BACKEND):
+    # Reuse the saved artifact and only retrain when the training CSV or the neighbor backend has changed
+    checksum = training_checksum(csv_path)
+    if (_preloaded is not None and _preloaded['checksum'] == checksum
+            and _preloaded['neighbor_backend'] == neighbor_backend):
+        return _preloaded
+    artifact = load_artifact(artifact_path, checksum, neighbor_backend)
+    if artifact is None:
+        artifact = train_model(csv_path, neighbor_backend)
+        try:
+            save_artifact(artifact, artifact_path)
+        except OSError:
+            # A read-only filesystem should not stop the service from starting
+            pass
+    return artifact
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Train the laptop recommendation model and save it as an artifact.')
+    parser.add_argument('--csv', default=TRAINING_CSV, help='training data CSV')
+    parser.add_argument('--output', default=ARTIFACT_PATH, help='where to write the model artifact')
+    parser.add_argument('--neighbor-backend', default=NEIGHBOR_BACKEND, choices=NEIGHBOR_BACKENDS, help='k-NN index to build')
+    args = parser.parse_args()
+
+    artifact = train_model(args.csv, args.neighbor_backend)
+    save_artifact(artifact, args.output)
+    print(f"Model artifact v{artifact['version']} written to '{args.output}' (checksum {artifact['checksum'][:12]}).")